@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark suite for server.py
+
+Builds a synthetic Flutter web build (many small files plus a few multi-MB
+bundles), starts server.py against it in several configurations and drives
+each one with the load generator from test_app.py, once on a freshly started
+server (cold cache) and once after every file has been fetched (warm cache).
+Requests/sec, latency percentiles, server CPU time and peak RSS are recorded
+and compared against a stored baseline; the run fails if throughput drops or
+p99 latency grows by more than the allowed threshold. A run whose fixture or
+load settings differ from the baseline's is refused rather than compared.
+
+Everything runs offline on one Linux box (CPU and RSS are read from /proc).
+
+Usage:
+  python benchmarks/server_benchmark.py [--configs threaded,prefork] [--duration 10]
+                                        [--baseline benchmarks/server_baseline.json]
+                                        [--threshold 10] [--update-baseline]
+
+Requirements:
+  - Python 3.6+, Linux
+  - requests library (pip install requests)
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import requests  # noqa: E402
+from test_app import LoadGenerator  # noqa: E402
+
+SERVER = os.path.join(REPO_ROOT, "server.py")
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "server_baseline.json")
+
+PREFORK_PROCESSES = min(os.cpu_count() or 1, 4)
+
+# Named server.py configurations; extra arguments are appended to every run
+CONFIGS = {
+    "single": ["--mode", "single", "--cache-size-mb", "0"],
+    "threaded-nocache": ["--mode", "threaded", "--cache-size-mb", "0"],
+    "threaded": ["--mode", "threaded"],
+    "prefork": ["--mode", "threaded", "--processes", str(PREFORK_PROCESSES)],
+}
+
+# Settings that change what is measured; runs that differ in any of them are not comparable
+COMPARABLE_SETTINGS = ("duration", "concurrency", "small_files", "large_mb", "seed", "prefork_processes")
+
+# Passes over the build before a warm-up gives up waiting for every worker's cache to fill
+WARM_UP_ROUNDS = 10
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark server.py configurations against a baseline")
+    parser.add_argument("--configs", default="single,threaded-nocache,threaded,prefork",
+                        help=f"Comma-separated configurations to run, from: {', '.join(CONFIGS)}")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Load generator workers (default: 32)")
+    parser.add_argument("--small-files", type=int, default=400,
+                        help="Small files in the synthetic build (default: 400)")
+    parser.add_argument("--large-mb", type=int, default=4,
+                        help="Size of each large bundle in MB (default: 4)")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for the fixture and the request mix")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="Allowed regression in percent for req/s and p99 latency (default: 10)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing")
+    parser.add_argument("--output-json", help="Path to write this run's results")
+    parser.add_argument("--keep-fixture", action="store_true", help="Do not delete the synthetic build")
+    return parser.parse_args()
+
+def build_fixture(root, small_files, large_mb, seed):
+    """Write a deterministic stand-in for build/web and return the request mix for it"""
+    rng = random.Random(seed)
+    words = [f"flutter_{i}" for i in range(512)]
+
+    def text(size):
+        # Compressible, JS-like content
+        chunks, length = [], 0
+        while length < size:
+            line = "var " + " = ".join(rng.choice(words) for _ in range(6)) + ";\n"
+            chunks.append(line)
+            length += len(line)
+        return "".join(chunks)[:size]
+
+    os.makedirs(os.path.join(root, "assets", "fonts"))
+    os.makedirs(os.path.join(root, "assets", "packages"))
+    os.makedirs(os.path.join(root, "canvaskit"))
+    with open(os.path.join(root, "index.html"), "w") as f:
+        f.write('<!DOCTYPE html><html><head><script src="flutter_bootstrap.js" async></script>'
+                '</head><body>' + text(1500) + '</body></html>')
+    with open(os.path.join(root, "flutter_bootstrap.js"), "w") as f:
+        f.write(text(10 * 1024))
+    with open(os.path.join(root, "main.dart.js"), "w") as f:
+        f.write(text(large_mb * 1024 * 1024))
+    def binary(size):
+        # Incompressible, like wasm and font files
+        return rng.getrandbits(size * 8).to_bytes(size, "little")
+
+    with open(os.path.join(root, "canvaskit", "canvaskit.wasm"), "wb") as f:
+        f.write(binary(large_mb * 1024 * 1024))
+    with open(os.path.join(root, "assets", "fonts", "MaterialIcons-Regular.otf"), "wb") as f:
+        f.write(binary(200 * 1024))
+
+    small = []
+    for i in range(small_files):
+        name = f"assets/packages/chunk_{i}.js" if i % 2 else f"assets/packages/data_{i}.json"
+        with open(os.path.join(root, name), "w") as f:
+            f.write(text(rng.randint(1024, 20 * 1024)))
+        small.append("/" + name)
+
+    mix = [("/", 4), ("/login", 2), ("/dashboard", 2), ("/flutter_bootstrap.js", 3),
+           ("/main.dart.js", 1), ("/canvaskit/canvaskit.wasm", 1),
+           ("/assets/fonts/MaterialIcons-Regular.otf", 1)]
+    mix += [(path, 10.0 / len(small)) for path in small]
+    return mix, ["/", "/flutter_bootstrap.js", "/main.dart.js", "/canvaskit/canvaskit.wasm",
+                 "/assets/fonts/MaterialIcons-Regular.otf"] + small
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def process_tree(pid):
+    """pid and all of its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def resource_usage(pid):
+    """(CPU seconds, peak RSS in KB) summed over the server's process tree"""
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu, rss = 0.0, 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        rss += int(line.split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+def start_server(config, fixture, port):
+    args = [sys.executable, SERVER, "--directory", fixture, "--port", str(port),
+            "--bind", "127.0.0.1", "--access-log", "off"] + CONFIGS[config]
+    proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"server.py ({config}) did not start listening on port {port}")
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def run_scenario(proc, port, mix, args):
+    cpu_before, _ = resource_usage(proc.pid)
+    generator = LoadGenerator(f"http://127.0.0.1:{port}", mix, args.concurrency,
+                              duration=args.duration, seed=args.seed)
+    report = generator.run()
+    cpu_after, peak_rss = resource_usage(proc.pid)
+    overall = report["overall"]
+    return {
+        "requests_per_s": overall["throughput_rps"],
+        "bytes_per_s": overall["throughput_bytes_per_s"],
+        "error_rate": overall["error_rate"],
+        "latency_ms": overall["latency_ms"],
+        "server_cpu_s": round(cpu_after - cpu_before, 3),
+        "server_cpu_ms_per_request": round((cpu_after - cpu_before) * 1000 / overall["requests"], 3)
+        if overall["requests"] else None,
+        "server_peak_rss_kb": peak_rss,
+    }
+
+def cache_misses(port):
+    """Asset cache misses summed over all server processes, from the metrics endpoint"""
+    response = requests.get(f"http://127.0.0.1:{port}/__metrics", timeout=10)
+    for line in response.text.splitlines():
+        if line.startswith("spa_asset_cache_misses_total "):
+            return float(line.split()[1])
+    return 0.0
+
+def warm_up(port, paths, processes=1):
+    """Fetch every file until a full pass causes no asset cache misses.
+
+    Every request uses a new connection and each pass fetches every file
+    `processes` times in parallel, so with a prefork server the requests
+    spread over all workers and each worker's own cache ends up holding the
+    whole build. Returns the passes made.
+    """
+    def fetch(path):
+        requests.get(f"http://127.0.0.1:{port}{path}", headers={"Connection": "close"}, timeout=30)
+
+    with ThreadPoolExecutor(max_workers=max(processes * 2, 1)) as pool:
+        for rounds in range(1, WARM_UP_ROUNDS + 1):
+            before = cache_misses(port)
+            list(pool.map(fetch, paths * max(processes, 1)))
+            if cache_misses(port) == before:
+                return rounds
+    print(f"  Warning: asset caches still missing after {WARM_UP_ROUNDS} warm-up passes")
+    return WARM_UP_ROUNDS
+
+def check_comparable(run, baseline):
+    """Return (problems that make the runs incomparable, warnings about the environment)"""
+    problems, warnings = [], []
+    previous = baseline.get("settings")
+    if previous is None:
+        warnings.append("baseline records no settings")
+    else:
+        for key in COMPARABLE_SETTINGS:
+            if previous.get(key) != run["settings"].get(key):
+                problems.append(f"{key}: baseline {previous.get(key)}, this run {run['settings'].get(key)}")
+    for key in ("host", "cpus"):
+        if baseline.get(key) != run[key]:
+            warnings.append(f"{key}: baseline {baseline.get(key)}, this run {run[key]}")
+    return problems, warnings
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages; empty when everything is within threshold"""
+    failures = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            print(f"  {key}: no baseline, skipped")
+            continue
+        rps_now, rps_then = current["requests_per_s"], previous["requests_per_s"]
+        p99_now, p99_then = current["latency_ms"]["p99"], previous["latency_ms"]["p99"]
+        if p99_now is None or not rps_now:
+            failures.append(f"{key}: no requests completed (baseline {rps_then} req/s)")
+            print(f"  {key}: no requests completed [FAIL]")
+            continue
+        # A baseline of 0 req/s comes from a failed run and cannot be regressed from
+        rps_change = (rps_now - rps_then) / rps_then * 100 if rps_then else 0.0
+        p99_change = (p99_now - p99_then) / p99_then * 100 if p99_then else 0.0
+        verdict = "OK"
+        if rps_change < -threshold:
+            failures.append(f"{key}: req/s {rps_then} -> {rps_now} "
+                            f"({rps_change:+.1f}%)")
+            verdict = "FAIL"
+        if p99_change > threshold:
+            failures.append(f"{key}: p99 {p99_then}ms -> {p99_now}ms ({p99_change:+.1f}%)")
+            verdict = "FAIL"
+        print(f"  {key}: req/s {rps_change:+.1f}%, p99 {p99_change:+.1f}% [{verdict}]")
+    return failures
+
+def main():
+    args = parse_arguments()
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    unknown = [c for c in configs if c not in CONFIGS]
+    if unknown:
+        print(f"Error: unknown configurations: {', '.join(unknown)}")
+        return 2
+
+    fixture = tempfile.mkdtemp(prefix="spa-bench-")
+    try:
+        mix, all_paths = build_fixture(fixture, args.small_files, args.large_mb, args.seed)
+        print(f"Synthetic build with {len(all_paths)} files in {fixture}")
+        results = {}
+        for config in configs:
+            for scenario in ("cold", "warm"):
+                port = free_port()
+                proc = start_server(config, fixture, port)
+                try:
+                    if scenario == "warm":
+                        processes = PREFORK_PROCESSES if "--processes" in CONFIGS[config] else 1
+                        warm_up(port, all_paths, processes)
+                    result = run_scenario(proc, port, mix, args)
+                finally:
+                    stop_server(proc)
+                key = f"{config}/{scenario}"
+                results[key] = result
+                latency = result["latency_ms"]
+                print(f"{key}: {result['requests_per_s']} req/s, p50={latency['p50']}ms "
+                      f"p99={latency['p99']}ms, errors={result['error_rate'] * 100:.2f}%, "
+                      f"cpu={result['server_cpu_s']}s, rss={result['server_peak_rss_kb']}KB")
+    finally:
+        if args.keep_fixture:
+            print(f"Fixture kept in {fixture}")
+        else:
+            shutil.rmtree(fixture, ignore_errors=True)
+
+    run = {
+        "timestamp": datetime.now().isoformat(),
+        "host": socket.gethostname(),
+        "cpus": os.cpu_count(),
+        "settings": {"duration": args.duration, "concurrency": args.concurrency,
+                     "small_files": args.small_files, "large_mb": args.large_mb, "seed": args.seed,
+                     "prefork_processes": PREFORK_PROCESSES},
+        "results": results,
+    }
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nJSON results written to {args.output_json}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; rerun with --update-baseline to store one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    problems, warnings = check_comparable(run, baseline)
+    for warning in warnings:
+        print(f"\nWarning: {warning}; numbers from different machines may not be comparable")
+    if problems:
+        print(f"\nError: this run is not comparable with the baseline from {baseline.get('timestamp')}:")
+        for problem in problems:
+            print(f"  {problem}")
+        print("Rerun with the baseline's settings, or store a new baseline with --update-baseline")
+        return 2
+    print(f"\nComparing against baseline from {baseline.get('timestamp')} "
+          f"(threshold {args.threshold}%):")
+    failures = compare(results, baseline.get("results", {}), args.threshold)
+    if failures:
+        print("\nRegressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nNo regressions beyond threshold")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,8 @@ flutter build web --release --obfuscate --split-debug-info=./symbols
 
 if [ $? -eq 0 ]; then
   echo "\nBuild successful! Web app is available in build/web/"
+  echo "Precompressing assets for server.py..."
+  python3 "$(dirname "$0")/precompress.py" build/web
   echo "You can deploy this to any web hosting service like Firebase Hosting, Vercel, or GitHub Pages."
   echo "\nTo test locally, you can run:"
   echo "cd build/web && python -m http.server 8000"
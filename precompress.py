@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Offline precompression for the Flutter web build
+
+Walks build/web with a process pool, writes .gz (and .br, when the brotli
+module is installed) siblings next to every compressible asset and records
+sizes, SHA-256 hashes and ETags in a build manifest. server.py loads that
+manifest at startup, so it serves the precompressed files directly and never
+compresses on the request path.
+
+Usage:
+  python precompress.py [build/web] [--jobs 8] [--force]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from server import BUILD_MANIFEST, COMPRESSIBLE_TYPES, MIN_COMPRESS_SIZE, brotli, guess_content_type
+
+SIBLING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+# Files are written under this suffix and renamed into place; leftovers from an
+# interrupted run are never picked up as assets
+TMP_SUFFIX = '.precompress-tmp'
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Precompress the Flutter web build and write its manifest")
+    parser.add_argument("root", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build', 'web'),
+                        help="Web build directory (default: build/web next to this script)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--gzip-level", type=int, default=9, help="gzip compression level (default: 9)")
+    parser.add_argument("--brotli-quality", type=int, default=11, help="brotli quality (default: 11)")
+    parser.add_argument("--force", action="store_true",
+                        help="Recompress files whose siblings look up to date")
+    return parser.parse_args()
+
+def find_assets(root):
+    """Return (url, path, content_type) for every servable file under root"""
+    assets = []
+    for directory, _, names in os.walk(root):
+        prefix = '/' + os.path.relpath(directory, root).replace(os.sep, '/')
+        if prefix == '/.':
+            prefix = ''
+        present = set(names)
+        for name in names:
+            url = f'{prefix}/{name}'
+            if url == '/' + BUILD_MANIFEST or is_generated(name, present):
+                continue
+            ext = posixpath.splitext(name)[1].lower()
+            assets.append((url, os.path.join(directory, name), guess_content_type(ext)))
+    return assets
+
+def is_generated(name, present):
+    """True for a file this script writes: a temp file, or an <asset>.gz / <asset>.br
+    sibling whose <asset> is in present"""
+    if name.endswith(TMP_SUFFIX):
+        return True
+    if name.endswith('.tmp'):
+        # Temp name used by earlier versions of this script
+        name = name[:-len('.tmp')]
+    return any(name.endswith(suffix) and name[:-len(suffix)] in present
+               for suffix in SIBLING_SUFFIXES.values())
+
+def process_asset(url, path, content_type, gzip_level, brotli_quality, force):
+    """Hash one file and write its compressed siblings; runs in a worker process"""
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    record = {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': digest,
+        'etag': f'"{digest[:32]}"',
+        'content_type': content_type,
+        'encodings': {},
+    }
+    if len(data) < MIN_COMPRESS_SIZE or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return url, record
+
+    compressors = {'gzip': lambda: gzip.compress(data, compresslevel=gzip_level, mtime=0)}
+    if brotli is not None:
+        compressors['br'] = lambda: brotli.compress(data, quality=brotli_quality)
+    for encoding, compress in compressors.items():
+        sibling = path + SIBLING_SUFFIXES[encoding]
+        try:
+            sibling_st = os.stat(sibling)
+            up_to_date = not force and sibling_st.st_mtime_ns == st.st_mtime_ns
+        except OSError:
+            up_to_date = False
+        if up_to_date:
+            size = sibling_st.st_size
+        else:
+            body = compress()
+            if len(body) >= len(data):
+                # Not worth serving; drop a stale sibling from an earlier build
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+                continue
+            tmp = sibling + TMP_SUFFIX
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            # The sibling carries the source mtime so reruns can skip it
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp, sibling)
+            size = len(body)
+        if size < len(data):
+            record['encodings'][encoding] = {'file': os.path.basename(sibling), 'size': size}
+    return url, record
+
+def main():
+    args = parse_arguments()
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"Error: {root} not found, run build_web.sh first")
+        return 1
+    if brotli is None:
+        print("Warning: brotli module not installed, writing gzip siblings only")
+
+    started = time.monotonic()
+    assets = find_assets(root)
+    print(f"Precompressing {len(assets)} files in {root} with {args.jobs} workers...")
+
+    files = {}
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(process_asset, url, path, content_type,
+                               args.gzip_level, args.brotli_quality, args.force)
+                   for url, path, content_type in assets]
+        for future in futures:
+            url, record = future.result()
+            files[url] = record
+
+    original = sum(r['size'] for r in files.values() if r['encodings'])
+    compressed = sum(min(e['size'] for e in r['encodings'].values())
+                     for r in files.values() if r['encodings'])
+    manifest_path = os.path.join(root, BUILD_MANIFEST)
+    tmp = manifest_path + TMP_SUFFIX
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': 1,
+            'generated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'files': dict(sorted(files.items())),
+        }, f, indent=1)
+    os.replace(tmp, manifest_path)
+
+    print(f"Compressed {sum(1 for r in files.values() if r['encodings'])} files: "
+          f"{original} -> {compressed} bytes in {time.monotonic() - started:.1f}s")
+    print(f"Manifest written to {manifest_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
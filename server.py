@@ -1,8 +1,656 @@
 #!/usr/bin/env python3
+import argparse
+import bisect
+import fcntl
+import gzip
 import http.server
+import json
+import mimetypes
+import mmap
 import socketserver
 import os
-from urllib.parse import urlparse
+import posixpath
+import queue
+import re
+import selectors
+import signal
+import socket
+import stat
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from urllib.parse import unquote, urlparse
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Content types worth compressing; images, fonts and archives are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'application/manifest+json', 'application/wasm', 'image/svg+xml')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MIN_COMPRESS_SIZE = 1024
+MAX_RANGES = 16
+# first-last, first- or -suffix, in ASCII digits only
+BYTE_RANGE_SPEC = re.compile(r'([0-9]+)-([0-9]*)|-([0-9]+)')
+
+# Written into the web root by precompress.py: hashes, ETags and .gz/.br siblings
+BUILD_MANIFEST = '.spa-manifest.json'
+
+# Flutter entry points that must be revalidated on every load
+NO_CACHE_FILES = frozenset(['index.html', 'flutter_bootstrap.js', 'flutter.js',
+                            'flutter_service_worker.js', 'manifest.json', 'version.json'])
+# Build outputs with a content hash in their name, e.g. main.3f9a2c1d0b7e4a65.js: at
+# least 16 hex digits including a letter, so dates and plain numbers
+# (report-20240101.json) are not served as immutable
+HASHED_NAME = re.compile(r'[.-](?=[0-9a-f]*[a-f])[0-9a-f]{16,}\.[A-Za-z0-9]+$')
+
+def parse_accept_encoding(header):
+    """Return a dict of content-coding -> q-value from an Accept-Encoding header"""
+    codings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding] = q
+    return codings
+
+def parse_byte_ranges(header, size):
+    """Parse a Range header into a list of inclusive (start, end) byte ranges.
+
+    Returns None when the header is absent, malformed or asks for too many
+    ranges (the whole body should be sent), and an empty list when none of the
+    ranges can be satisfied.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    # Empty list elements are allowed (RFC 9110, section 5.6.1)
+    specs = [spec.strip() for spec in specs.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        match = BYTE_RANGE_SPEC.fullmatch(spec)
+        if match is None:
+            return None
+        first, last, suffix = match.groups()
+        if suffix is not None:
+            # Suffix range: the last N bytes
+            suffix = int(suffix)
+            if suffix <= 0:
+                continue
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if start > end and last:
+                return None
+            end = min(end, size - 1)
+        if start < size:
+            ranges.append((start, end))
+    return ranges
+
+def choose_encoding(accept_encoding, available):
+    """Pick the best of the available content-codings the client accepts, or identity"""
+    if not available or not accept_encoding:
+        return 'identity'
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get('*', 0.0)
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return 'identity'
+
+class CachedAsset:
+    """A file held in memory together with its precomputed compressed encodings"""
+
+    __slots__ = ('version', 'content_type', 'bodies', 'size')
+
+    def __init__(self, version, content_type, bodies):
+        # version is (mtime_ns, size) of the file the bodies were read from
+        self.version = version
+        self.content_type = content_type
+        self.bodies = bodies
+        self.size = sum(len(body) for body in bodies.values())
+
+    def negotiate(self, accept_encoding):
+        """Pick the preferred encoding the client accepts (br, then gzip), falling back to identity"""
+        if len(self.bodies) == 1:
+            return 'identity'
+        return choose_encoding(accept_encoding, self.bodies)
+
+class AssetCache:
+    """Size-bounded LRU cache of file contents keyed by filesystem path.
+
+    Entries are invalidated when the file's mtime or size changes. Compressible
+    assets are stored with gzip (and brotli, when installed) variants so that
+    compression runs once per file version instead of once per request; files
+    precompressed by precompress.py load their .gz/.br siblings instead.
+    """
+
+    def __init__(self, max_bytes, max_file_bytes):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, path, content_type, version=None, encodings=None):
+        """Return the CachedAsset for path, or None if it is not a cacheable file.
+
+        version is the file's (mtime_ns, size) when the caller already knows it,
+        as it does from the AssetManifest; otherwise the file is stat()ed.
+        encodings maps content-codings to precompressed (path, size) siblings.
+        It is None for files precompress.py has not seen, which are compressed
+        here instead; an empty mapping means compression was not worth it.
+        """
+        if version is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            if not stat.S_ISREG(st.st_mode):
+                return None
+            version = (st.st_mtime_ns, st.st_size)
+        if version[1] > self.max_file_bytes:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            # Only one thread loads a given file; the others wait for its result
+            loading = self._loading.get(path)
+            if loading is None:
+                loading = self._loading[path] = threading.Lock()
+        with loading:
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None and entry.version == version:
+                    return entry
+            try:
+                entry = self._load(path, version, content_type, encodings)
+            except OSError:
+                return None
+            finally:
+                with self._lock:
+                    self._loading.pop(path, None)
+            self._store(path, entry)
+        return entry
+
+    def _load(self, path, version, content_type, encodings=None):
+        with open(path, 'rb') as f:
+            data = f.read()
+        bodies = {'identity': data}
+        if encodings is not None:
+            for encoding, (sibling, _) in encodings.items():
+                with open(sibling, 'rb') as f:
+                    bodies[encoding] = f.read()
+        elif len(data) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            gzipped = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+            if len(gzipped) < len(data):
+                bodies['gzip'] = gzipped
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+                if len(compressed) < len(data):
+                    bodies['br'] = compressed
+        return CachedAsset(version, content_type, bodies)
+
+    def _store(self, path, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self.current_bytes -= previous.size
+            self._entries[path] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+
+def guess_content_type(ext):
+    """Content type for a lower-case file extension, as SimpleHTTPRequestHandler maps it"""
+    extensions_map = http.server.SimpleHTTPRequestHandler.extensions_map
+    if ext in extensions_map:
+        return extensions_map[ext]
+    return mimetypes.types_map.get(ext, 'application/octet-stream')
+
+def cache_control_for(url, max_age=0, immutable_pattern=HASHED_NAME):
+    """Cache-Control value for a URL path of the Flutter build.
+
+    Bootstrap files must always be revalidated or a deploy is never picked up;
+    file names carrying a content hash can be cached forever; everything else
+    is cached for max_age seconds (revalidated every time when 0).
+    """
+    name = posixpath.basename(url)
+    if name in NO_CACHE_FILES or name.endswith('service_worker.js'):
+        return 'no-cache'
+    if immutable_pattern is not None and immutable_pattern.search(name):
+        return 'public, max-age=31536000, immutable'
+    if max_age > 0:
+        return f'public, max-age={max_age}'
+    return 'no-cache'
+
+class FileEntry:
+    """A servable file recorded in the AssetManifest"""
+
+    __slots__ = ('path', 'url', 'size', 'mtime_ns', 'content_type', 'etag', 'cache_control',
+                 'encodings')
+
+    def __init__(self, path, url, size, mtime_ns, content_type, cache_control, etag=None,
+                 encodings=None):
+        self.path = path
+        self.url = url
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.content_type = content_type
+        # Content-hash ETag from the build manifest when there is one
+        self.etag = etag or f'"{mtime_ns:x}-{size:x}"'
+        self.cache_control = cache_control
+        # content-coding -> (path, size) of a precompressed sibling; None when the
+        # build manifest has no record of this file
+        self.encodings = encodings
+
+    @property
+    def version(self):
+        return (self.mtime_ns, self.size)
+
+class AssetManifest:
+    """In-memory index of every file under the web root, keyed by URL path.
+
+    A request that misses the index is treated as a client-side route and gets
+    the fallback document, unless it lies under a directory that exists in the
+    build (assets/, canvaskit/, icons/, ...) or ends in an extension the build
+    contains, in which case it is a missing asset and gets a 404. The index is
+    rebuilt in the background every refresh_interval seconds, so a fresh
+    `flutter build web` is picked up without restarting.
+    """
+
+    def __init__(self, root, fallback='index.html', refresh_interval=2.0, max_age=0,
+                 immutable_pattern=HASHED_NAME):
+        self.root = os.path.abspath(root)
+        self.fallback = '/' + fallback.lstrip('/')
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.immutable_pattern = immutable_pattern
+        self._snapshot = ({}, frozenset(), frozenset())
+        self._build_manifest = (None, {})
+        self.scan()
+
+    def load_build_manifest(self):
+        """Return the per-URL records written by precompress.py, re-read only when it changes"""
+        path = os.path.join(self.root, BUILD_MANIFEST)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        if self._build_manifest[0] != mtime_ns:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    records = json.load(f).get('files', {})
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"Warning: ignoring unreadable {BUILD_MANIFEST}: {e}")
+                records = {}
+            self._build_manifest = (mtime_ns, records)
+        return self._build_manifest[1]
+
+    def scan(self):
+        """Walk the web root and atomically replace the index"""
+        records = self.load_build_manifest()
+        files = {}
+        asset_dirs = set()
+        extensions = set()
+        stack = [(self.root, '')]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        url = prefix + '/' + item.name
+                        if item.is_dir():
+                            if not prefix:
+                                asset_dirs.add(item.name)
+                            stack.append((item.path, url))
+                        elif item.is_file() and url != '/' + BUILD_MANIFEST:
+                            st = item.stat()
+                            ext = posixpath.splitext(item.name)[1].lower()
+                            if ext:
+                                extensions.add(ext)
+                            files[url] = FileEntry(item.path, url, st.st_size, st.st_mtime_ns,
+                                                   guess_content_type(ext),
+                                                   cache_control_for(url, self.max_age,
+                                                                     self.immutable_pattern))
+            except OSError:
+                continue
+        # Records only apply to the exact file version precompress.py saw
+        for url, record in records.items():
+            entry = files.get(url)
+            if (entry is None or record.get('size') != entry.size
+                    or record.get('mtime_ns') != entry.mtime_ns):
+                continue
+            entry.etag = record.get('etag') or entry.etag
+            entry.encodings = {}
+            for encoding, sibling in record.get('encodings', {}).items():
+                sibling_entry = files.get(posixpath.join(posixpath.dirname(url), sibling['file']))
+                if sibling_entry is not None and sibling_entry.size == sibling['size']:
+                    entry.encodings[encoding] = (sibling_entry.path, sibling_entry.size)
+        # Directory URLs serve their index.html, like SimpleHTTPRequestHandler
+        for url in [u for u in files if u.endswith('/index.html')]:
+            files.setdefault(url[:-len('index.html')], files[url])
+        self._snapshot = (files, frozenset(asset_dirs), frozenset(extensions))
+
+    def resolve(self, url_path):
+        """Return (FileEntry or None, is_route) for a decoded URL path"""
+        files, asset_dirs, extensions = self._snapshot
+        entry = files.get(url_path)
+        if entry is not None:
+            return entry, False
+        if self.is_asset_path(url_path, asset_dirs, extensions):
+            return None, False
+        return files.get(self.fallback), True
+
+    @staticmethod
+    def is_asset_path(url_path, asset_dirs, extensions):
+        segments = url_path.lstrip('/').split('/')
+        if len(segments) > 1 and segments[0] in asset_dirs:
+            return True
+        ext = posixpath.splitext(segments[-1])[1].lower()
+        return bool(ext) and ext in extensions
+
+    def start_polling(self):
+        """Rescan the web root in a daemon thread every refresh_interval seconds"""
+        if self.refresh_interval <= 0:
+            return
+        def poll():
+            while True:
+                time.sleep(self.refresh_interval)
+                self.scan()
+        threading.Thread(target=poll, name='manifest-poller', daemon=True).start()
+
+class ServerMetrics:
+    """Request counters and latency histograms exported in Prometheus text format.
+
+    Values live in an anonymous shared memory map with one row per serving
+    process, so with --processes every worker writes only its own row (no
+    cross-process locking) and a scrape of any worker reports the sum of all
+    of them. A worker restarted by the supervisor takes over its row and adds
+    to what the dead worker counted, which keeps the counters monotonic; the
+    gauges in it are zeroed first, since the connections the dead worker had
+    open went away with it.
+    """
+
+    KINDS = ('asset', 'route', 'other')
+    STATUSES = (200, 206, 304, 400, 404, 405, 416, 500, 501, 503)
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, processes=1):
+        statuses = len(self.STATUSES) + 1  # last column counts any other status
+        buckets = len(self.BUCKETS) + 1  # last bucket is +Inf
+        self._requests = 0
+        self._latency = self._requests + len(self.KINDS) * statuses
+        self._latency_sum = self._latency + len(self.KINDS) * buckets
+        self._bytes_sent = self._latency_sum + len(self.KINDS)
+        self._in_flight = self._bytes_sent + 1
+        self._cache_hits = self._in_flight + 1
+        self._cache_misses = self._cache_hits + 1
+        self._log_dropped = self._cache_misses + 1
+        self._row_length = self._log_dropped + 1
+        self._status_index = {status: i for i, status in enumerate(self.STATUSES)}
+        self._buffer = mmap.mmap(-1, processes * self._row_length * 8)
+        self._values = memoryview(self._buffer).cast('d')
+        self.processes = processes
+        self._lock = threading.Lock()
+        self.bind_slot(0)
+
+    def bind_slot(self, slot):
+        """Make this process write to the given row; called in each forked worker"""
+        self._lock = threading.Lock()
+        self._row = self._values[slot * self._row_length:(slot + 1) * self._row_length]
+        # Last value of each process-local counter (asset cache, access log)
+        # already added to the row
+        self._synced = {}
+
+    def reset_gauges(self, slot):
+        """Zero the gauges of a row before it is handed to a replacement worker"""
+        self._values[slot * self._row_length + self._in_flight] = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self._row[self._in_flight] += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self._row[self._in_flight] -= 1
+
+    def record(self, kind, status, seconds, bytes_sent, asset_cache=None, access_log=None):
+        """Count one finished request"""
+        k = self.KINDS.index(kind)
+        s = self._status_index.get(status, len(self.STATUSES))
+        b = bisect.bisect_left(self.BUCKETS, seconds)
+        row = self._row
+        with self._lock:
+            row[self._requests + k * (len(self.STATUSES) + 1) + s] += 1
+            row[self._latency + k * (len(self.BUCKETS) + 1) + b] += 1
+            row[self._latency_sum + k] += seconds
+            row[self._bytes_sent] += bytes_sent
+            if asset_cache is not None:
+                self._sync(self._cache_hits, asset_cache.hits)
+                self._sync(self._cache_misses, asset_cache.misses)
+            if access_log is not None:
+                self._sync(self._log_dropped, access_log.dropped)
+
+    def _sync(self, index, value):
+        """Add what a process-local counter grew by since the last sync; lock held"""
+        self._row[index] += value - self._synced.get(index, 0)
+        self._synced[index] = value
+
+    def _totals(self):
+        totals = [0.0] * self._row_length
+        for slot in range(self.processes):
+            row = self._values[slot * self._row_length:(slot + 1) * self._row_length]
+            for i, value in enumerate(row):
+                totals[i] += value
+        return totals
+
+    def render(self):
+        """Return the current values in Prometheus text exposition format"""
+        t = self._totals()
+        statuses = [str(status) for status in self.STATUSES] + ['other']
+        lines = [
+            '# HELP spa_requests_total Requests served, by response status and route-vs-asset kind.',
+            '# TYPE spa_requests_total counter',
+        ]
+        for k, kind in enumerate(self.KINDS):
+            for s, status in enumerate(statuses):
+                value = t[self._requests + k * len(statuses) + s]
+                if value:
+                    lines.append(f'spa_requests_total{{kind="{kind}",status="{status}"}} {value:.0f}')
+        lines += [
+            '# HELP spa_request_duration_seconds Time spent handling GET/HEAD requests.',
+            '# TYPE spa_request_duration_seconds histogram',
+        ]
+        for k, kind in enumerate(self.KINDS):
+            cumulative = 0
+            base = self._latency + k * (len(self.BUCKETS) + 1)
+            for b, bound in enumerate(self.BUCKETS + (float('inf'),)):
+                cumulative += t[base + b]
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'spa_request_duration_seconds_bucket{{kind="{kind}",le="{le}"}} {cumulative:.0f}')
+            lines.append(f'spa_request_duration_seconds_sum{{kind="{kind}"}} {t[self._latency_sum + k]:.6f}')
+            lines.append(f'spa_request_duration_seconds_count{{kind="{kind}"}} {cumulative:.0f}')
+        hits, misses = t[self._cache_hits], t[self._cache_misses]
+        lookups = hits + misses
+        lines += [
+            '# HELP spa_response_bytes_total Bytes announced in Content-Length of response bodies.',
+            '# TYPE spa_response_bytes_total counter',
+            f'spa_response_bytes_total {t[self._bytes_sent]:.0f}',
+            '# HELP spa_connections_in_flight Client connections currently open.',
+            '# TYPE spa_connections_in_flight gauge',
+            f'spa_connections_in_flight {t[self._in_flight]:.0f}',
+            '# HELP spa_asset_cache_hits_total Asset cache lookups served from memory.',
+            '# TYPE spa_asset_cache_hits_total counter',
+            f'spa_asset_cache_hits_total {hits:.0f}',
+            '# HELP spa_asset_cache_misses_total Asset cache lookups that read the file.',
+            '# TYPE spa_asset_cache_misses_total counter',
+            f'spa_asset_cache_misses_total {misses:.0f}',
+            '# HELP spa_asset_cache_hit_ratio Share of asset cache lookups that were hits.',
+            '# TYPE spa_asset_cache_hit_ratio gauge',
+            f'spa_asset_cache_hit_ratio {hits / lookups if lookups else 0:.4f}',
+            '# HELP spa_access_log_dropped_total Access log records dropped because the queue was full.',
+            '# TYPE spa_access_log_dropped_total counter',
+            f'spa_access_log_dropped_total {t[self._log_dropped]:.0f}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+class AccessLog:
+    """Non-blocking access log written by a background thread.
+
+    Request threads only put a small tuple on a bounded queue; formatting,
+    writing and rotation happen on the writer thread, which drains the queue
+    in batches and issues one write per batch. When the queue is full the
+    record is dropped and counted rather than making the request wait.
+    """
+
+    def __init__(self, path=None, fmt='common', queue_size=10000, batch_size=256,
+                 flush_interval=0.5, max_bytes=0, backup_count=5):
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        # Counted by request threads and the writer thread, under _dropped_lock
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._queue = queue.Queue(queue_size)
+        self._stream = None
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread; called in every serving process"""
+        self._open()
+        self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self.path:
+            self._stream.close()
+
+    def log(self, client, request_line, status, size, referer, user_agent, message=None):
+        try:
+            self._queue.put_nowait((time.time(), client, request_line, status, size,
+                                    referer, user_agent, message))
+        except queue.Full:
+            self._count_dropped(1)
+
+    def _count_dropped(self, count):
+        with self._dropped_lock:
+            self.dropped += count
+
+    def _open(self):
+        if self.path:
+            self._stream = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._stream = sys.stderr
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [self._format(record) for record in batch if record is not None]
+            if lines:
+                try:
+                    self._stream.write(''.join(lines))
+                    self._stream.flush()
+                    self._maybe_rotate()
+                except (OSError, ValueError):
+                    self._count_dropped(len(lines))
+            if stop:
+                return
+
+    def _format(self, record):
+        ts, client, request_line, status, size, referer, user_agent, message = record
+        if self.fmt == 'json':
+            entry = {
+                'time': datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec='milliseconds'),
+                'client': client,
+            }
+            if message is not None:
+                entry['message'] = message
+            else:
+                entry.update(request=request_line, status=status, bytes=size,
+                             referer=referer, user_agent=user_agent)
+            return json.dumps(entry, separators=(',', ':')) + '\n'
+        stamp = time.strftime('%d/%b/%Y:%H:%M:%S +0000', time.gmtime(ts))
+        if message is not None:
+            return f'{client} - - [{stamp}] {message}\n'
+        return (f'{client} - - [{stamp}] "{request_line}" {status} {size} '
+                f'"{referer or "-"}" "{user_agent or "-"}"\n')
+
+    def _maybe_rotate(self):
+        if not self.path or self.max_bytes <= 0 or self._stream.tell() < self.max_bytes:
+            return
+        # Prefork workers share the file: rotate under a lock and re-check, since
+        # another worker may just have done it
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.getsize(self.path) >= self.max_bytes:
+                    for i in range(self.backup_count - 1, 0, -1):
+                        if os.path.exists(f'{self.path}.{i}'):
+                            os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+                    if self.backup_count > 0:
+                        os.replace(self.path, f'{self.path}.1')
+                    else:
+                        os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self._stream.close()
+        self._open()
 
 class SPAHandler(http.server.SimpleHTTPRequestHandler):
     """Handler for Single Page Applications (SPA) like Flutter web apps.
@@ -10,55 +658,797 @@ class SPAHandler(http.server.SimpleHTTPRequestHandler):
     This handler serves index.html for all routes that don't correspond to actual files,
     allowing client-side routing to work properly.
     """
+
+    # Persistent connections: an idle connection is closed after `timeout`
+    # seconds and every connection is closed after max_keepalive_requests;
+    # PooledHTTPServer parks idle connections so they do not hold a worker
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+    max_keepalive_requests = 100
+    # Headers and body go out in separate writes; without TCP_NODELAY the body of
+    # a small response on a kept-alive connection waits ~40ms for a delayed ACK
+    disable_nagle_algorithm = True
+
+    # Shared AssetManifest and AssetCache, set up in main(); with no cache every
+    # request is read from disk
+    manifest = None
+    asset_cache = None
+
+    # Shared ServerMetrics and the path it is exposed on; None disables both
+    metrics = None
+    metrics_path = '/__metrics'
+
+    # Background AccessLog; None keeps the synchronous stderr logging
+    access_log = None
+    log_requests = True
     
+    def handle(self):
+        self.requests_on_connection = 0
+        self.response_length = None
+        self.parked = False
+        if self.metrics is not None:
+            self.metrics.connection_opened()
+        self.serve_connection()
+
+    def serve_connection(self):
+        """Serve requests until the connection closes or goes idle.
+
+        When the server parks idle connections (PooledHTTPServer), this returns
+        with self.parked set as soon as no further request is waiting, instead
+        of blocking a worker thread until the client sends one.
+        """
+        self.parked = False
+        can_park = getattr(self.server, 'parks_idle_connections', False)
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if can_park and not self.request_waiting():
+                self.parked = True
+                return
+            self.handle_one_request()
+
+    def request_waiting(self):
+        """True when bytes of the next request are buffered or can be read right away"""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            # Let handle_one_request() run into the error and close the connection
+            return True
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def resume(self):
+        """Continue a parked connection once its next request has arrived"""
+        try:
+            self.serve_connection()
+        finally:
+            self.finish()
+
+    def close_parked(self):
+        """Release a parked connection the server is closing"""
+        self.parked = False
+        self.finish()
+
+    def finish(self):
+        if self.parked:
+            # Still open; the server watches it until the next request or its timeout
+            return
+        try:
+            super().finish()
+        finally:
+            if self.metrics is not None:
+                self.metrics.connection_closed()
+
+    def handle_one_request(self):
+        self.response_length = None
+        self.logged_status = None
+        self.headers = None
+        super().handle_one_request()
+        self.requests_on_connection += 1
+        if self.logged_status is not None:
+            # Logged once the response is complete so its size is known
+            self.access_log.log(self.client_address[0], self.requestline, self.logged_status,
+                                '-' if self.response_length is None else self.response_length,
+                                self.headers.get('Referer') if self.headers else None,
+                                self.headers.get('User-Agent') if self.headers else None)
+
     def do_GET(self):
-        # Parse the URL path
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        # Remove leading slash and handle empty path
-        if path == '/' or path == '':
-            path = 'index.html'
+        self.serve(head_only=False)
+
+    def do_HEAD(self):
+        self.serve(head_only=True)
+
+    def serve(self, head_only):
+        # Route-vs-asset decisions come from the manifest, no filesystem calls
+        path = unquote(urlparse(self.path).path)
+        if self.metrics is None:
+            self.serve_path(path, head_only)
+            return
+        if path == self.metrics_path:
+            self.send_metrics(head_only)
+            return
+        started = time.perf_counter()
+        self.response_status = None
+        kind = 'other'
+        try:
+            kind = self.serve_path(path, head_only)
+        finally:
+            self.metrics.record(kind, self.response_status, time.perf_counter() - started,
+                                0 if head_only else self.response_length or 0, self.asset_cache,
+                                self.access_log)
+
+    def serve_path(self, path, head_only):
+        """Serve a decoded URL path; returns 'asset', 'route' or 'other' for metrics"""
+        entry, is_route = self.manifest.resolve(path)
+        if entry is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return 'other'
+        self.send_asset(entry, head_only)
+        return 'route' if is_route else 'asset'
+
+    def send_metrics(self, head_only):
+        body = self.metrics.render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def log_request(self, code='-', size='-'):
+        if not self.log_requests:
+            return
+        if self.access_log is None:
+            super().log_request(code, size)
+            return
+        self.logged_status = code.value if isinstance(code, HTTPStatus) else code
+
+    def log_message(self, format, *args):
+        if not self.log_requests:
+            return
+        if self.access_log is None:
+            super().log_message(format, *args)
+            return
+        self.access_log.log(self.client_address[0], None, None, None, None, None,
+                            format % args)
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword == 'Content-Length':
+            self.response_length = int(value)
+        super().send_header(keyword, value)
+
+    def send_asset(self, entry, head_only=False, rescanned=False):
+        """Send a manifest entry, from the asset cache when possible"""
+        if self.asset_cache is not None:
+            cached = self.asset_cache.get(entry.path, entry.content_type, entry.version,
+                                          entry.encodings)
+            if cached is not None:
+                self.send_cached(entry, cached, head_only)
+                return
+        path, size, etag, headers = entry.path, entry.size, entry.etag, []
+        encoding = 'identity'
+        if entry.encodings:
+            headers.append(('Vary', 'Accept-Encoding'))
+            # Ranges always refer to the identity body
+            if not self.headers.get('Range'):
+                encoding = choose_encoding(self.headers.get('Accept-Encoding', ''), entry.encodings)
+                if encoding != 'identity':
+                    path, size = entry.encodings[encoding]
+                    etag = f'{etag[:-1]}-{encoding}"'
+                    headers.append(('Content-Encoding', encoding))
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            # Removed since the last manifest scan
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_size != size or (encoding == 'identity' and st.st_mtime_ns != entry.mtime_ns):
+                # Rewritten since the last manifest scan (a redeploy, or rescans turned
+                # off): never announce the old length. Rescan once and serve the new
+                # entry; if the file is still changing, describe it as it was opened.
+                if not rescanned:
+                    self.manifest.scan()
+                    current, _ = self.manifest.resolve(entry.url)
+                    if current is None:
+                        self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+                    else:
+                        self.send_asset(current, head_only, rescanned=True)
+                    return
+                entry = FileEntry(entry.path, entry.url, st.st_size, st.st_mtime_ns,
+                                  entry.content_type, entry.cache_control)
+                size, etag = st.st_size, entry.etag
+                if encoding != 'identity':
+                    etag = f'{etag[:-1]}-{encoding}"'
+            self.send_body(entry, size, etag,
+                           lambda offset, count: self.send_file(f, offset, count),
+                           head_only, headers)
+
+    def send_cached(self, entry, cached, head_only=False):
+        # Ranges always refer to the identity body
+        if self.headers.get('Range'):
+            encoding = 'identity'
         else:
-            path = path.lstrip('/')
-        
-        # Check if the requested file exists
-        if os.path.exists(path) and os.path.isfile(path):
-            # File exists, serve it normally
-            super().do_GET()
+            encoding = cached.negotiate(self.headers.get('Accept-Encoding', ''))
+        body = memoryview(cached.bodies[encoding])
+        headers = []
+        etag = entry.etag
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+            # Each encoding is a different representation with its own strong ETag
+            etag = f'{etag[:-1]}-{encoding}"'
+        if len(cached.bodies) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+        self.send_body(entry, len(body), etag,
+                       lambda offset, count: self.wfile.write(body[offset:offset + count]),
+                       head_only, headers)
+
+    def is_not_modified(self, etag, mtime_ns):
+        """Evaluate If-None-Match, or If-Modified-Since when there is no ETag condition"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            # Weak comparison, as RFC 9110 requires for If-None-Match
+            candidates = (tag.strip() for tag in if_none_match.split(','))
+            return any(tag.removeprefix('W/') == etag for tag in candidates)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return mtime_ns // 1_000_000_000 <= since.timestamp()
+        return False
+
+    def range_applies(self, etag, mtime_ns):
+        """Evaluate If-Range: a stale validator means the whole body is sent"""
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == etag
+        try:
+            return mtime_ns // 1_000_000_000 == int(parsedate_to_datetime(if_range).timestamp())
+        except (TypeError, ValueError):
+            return False
+
+    def send_body(self, entry, size, etag, write, head_only, headers=()):
+        """Send a 200, 206, 304 or 416 response for a representation of entry.
+
+        write(offset, count) sends that slice of the body to the client.
+        """
+        mtime_ns = entry.mtime_ns
+        content_type = entry.content_type
+        if self.is_not_modified(etag, mtime_ns):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', entry.cache_control)
+            self.send_header('Last-Modified', self.date_time_string(mtime_ns // 1_000_000_000))
+            for keyword, value in headers:
+                if keyword != 'Content-Encoding':
+                    self.send_header(keyword, value)
+            self.end_headers()
+            return
+
+        ranges = None
+        if self.range_applies(etag, mtime_ns):
+            ranges = parse_byte_ranges(self.headers.get('Range'), size)
+        if ranges is not None and not ranges:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        boundary = None
+        if ranges is None:
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(size))
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Content-Length', str(end - start + 1))
         else:
-            # File doesn't exist, check if it's a potential route
-            # For Flutter web apps, serve index.html for routes
-            if not '.' in os.path.basename(path):  # No file extension = likely a route
-                # Serve index.html instead
-                self.path = '/index.html'
-                super().do_GET()
-            else:
-                # File with extension doesn't exist, return 404
-                super().do_GET()
+            boundary = uuid.uuid4().hex
+            parts = [(f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                      f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode('latin-1')
+                     for start, end in ranges]
+            closing = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+            length = (sum(len(p) for p in parts) + len(closing)
+                      + sum(end - start + 1 for start, end in ranges))
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-Type', f'multipart/byteranges; boundary={boundary}')
+            self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', entry.cache_control)
+        self.send_header('Last-Modified', self.date_time_string(mtime_ns // 1_000_000_000))
+        for keyword, value in headers:
+            self.send_header(keyword, value)
+        self.end_headers()
+        if head_only:
+            return
+
+        if ranges is None:
+            write(0, size)
+        elif boundary is None:
+            start, end = ranges[0]
+            write(start, end - start + 1)
+        else:
+            for part, (start, end) in zip(parts, ranges):
+                self.wfile.write(part)
+                write(start, end - start + 1)
+            self.wfile.write(closing)
+
+    def send_file(self, f, offset, count):
+        """Copy part of an open file to the client.
+
+        socket.sendfile() uses os.sendfile() for a zero-copy transfer where the
+        platform supports it and falls back to plain send() otherwise.
+        """
+        self.wfile.flush()
+        self.connection.sendfile(f, offset, count)
     
     def end_headers(self):
         # Add CORS headers for development
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        if self.close_connection:
+            # send_error() has already asked for the connection to be closed
+            pass
+        elif self.requests_on_connection + 1 >= self.max_keepalive_requests:
+            # Also sets close_connection
+            self.send_header('Connection', 'close')
+        else:
+            self.send_header('Keep-Alive', f'timeout={self.timeout}, max='
+                             f'{self.max_keepalive_requests - self.requests_on_connection - 1}')
         super().end_headers()
 
-if __name__ == '__main__':
-    PORT = 8080
-    
+class ReusePortMixin:
+    """Sets SO_REUSEPORT before binding, so every prefork worker can bind the port"""
+
+    reuse_port = False
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+class SingleSPAHandler(SPAHandler):
+    """SPAHandler for SingleHTTPServer, which closes every connection after one response"""
+
+    # A persistent connection would hold the only thread until its idle timeout
+    protocol_version = 'HTTP/1.0'
+
+class SingleHTTPServer(ReusePortMixin, socketserver.TCPServer):
+    """Serves one connection at a time on the listening thread"""
+
+    def __init__(self, server_address, handler_class, reuse_port=False, bind_and_activate=True):
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+class PooledHTTPServer(ReusePortMixin, http.server.HTTPServer):
+    """HTTP server that hands each connection to a bounded pool of worker threads.
+
+    At most max_connections connections are held open at once (running, waiting
+    for a worker or idle between requests); anything beyond that is answered
+    with 503 and closed right away so a burst of clients cannot grow memory
+    without bound.
+
+    A worker only holds a persistent connection while a request is being
+    served. Between requests the handler parks the connection and a keep-alive
+    thread waits on every parked connection with a selector: a connection with
+    a new request goes back to the pool, one idle for longer than the handler's
+    timeout is closed. Idle browsers therefore never starve the pool, and when
+    all max_connections slots are taken the longest idle connection is closed
+    to make room for a new client.
+    """
+
+    # Checked by SPAHandler to decide whether it may park between requests
+    parks_idle_connections = True
+
+    def __init__(self, server_address, handler_class, workers=32, max_connections=256,
+                 backlog=128, reuse_port=False, bind_and_activate=True):
+        self.request_queue_size = backlog
+        self.reuse_port = reuse_port
+        self.max_connections = max_connections
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='spa-worker')
+        # Parked connections, oldest first: request -> (client_address, handler, deadline)
+        self._parked = OrderedDict()
+        self._parked_lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._live_registration = type(self._selector).__name__ in ('EpollSelector', 'KqueueSelector')
+        self._wakeup, self._wakeup_writer = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._closing = False
+        self._keepalive = threading.Thread(target=self._watch_parked, name='spa-keepalive', daemon=True)
+        self._keepalive.start()
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            if not self._close_oldest_parked() or not self._slots.acquire(blocking=False):
+                self._reject(request)
+                return
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _process_request_worker(self, request, client_address, handler=None):
+        parked = False
+        try:
+            if handler is None:
+                handler = self.finish_request(request, client_address)
+            else:
+                handler.resume()
+            parked = handler.parked
+        except (ConnectionError, TimeoutError):
+            # Client went away or stalled mid-response; nothing worth a traceback
+            pass
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if parked:
+                self._park(request, client_address, handler)
+            else:
+                self.shutdown_request(request)
+                self._slots.release()
+
+    def _park(self, request, client_address, handler):
+        timeout = handler.timeout
+        deadline = time.monotonic() + timeout if timeout is not None else float('inf')
+        with self._parked_lock:
+            if self._closing:
+                self._close_parked(request, handler)
+                return
+            # epoll and kqueue see a registration made during a blocked select(),
+            # and deadlines only grow, so the keep-alive thread needs waking only
+            # when it may be waiting without a timeout
+            wake = not self._parked or not self._live_registration
+            self._parked[request] = (client_address, handler, deadline)
+            self._selector.register(request, selectors.EVENT_READ)
+        if wake:
+            self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            # A wakeup is already pending, or the server is closing
+            pass
+
+    def _watch_parked(self):
+        """Keep-alive thread: resume readable parked connections, close expired ones"""
+        while True:
+            with self._parked_lock:
+                if self._closing:
+                    return
+                # Deadlines grow in parking order, so the first one is the nearest
+                deadline = next(iter(self._parked.values()))[2] if self._parked else None
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready = self._selector.select(timeout)
+            resumed, expired = [], []
+            now = time.monotonic()
+            with self._parked_lock:
+                for key, _ in ready:
+                    if key.fileobj is self._wakeup:
+                        try:
+                            while self._wakeup.recv(4096):
+                                pass
+                        except (BlockingIOError, OSError):
+                            pass
+                        continue
+                    entry = self._parked.pop(key.fileobj, None)
+                    if entry is not None:
+                        self._selector.unregister(key.fileobj)
+                        resumed.append((key.fileobj, entry))
+                while self._parked:
+                    request, entry = next(iter(self._parked.items()))
+                    if entry[2] > now:
+                        break
+                    del self._parked[request]
+                    self._selector.unregister(request)
+                    expired.append((request, entry))
+            for request, (client_address, handler, _) in resumed:
+                try:
+                    self._pool.submit(self._process_request_worker, request, client_address, handler)
+                except RuntimeError:
+                    # Pool already shut down
+                    self._close_parked(request, handler)
+            for request, (_, handler, _) in expired:
+                self._close_parked(request, handler)
+
+    def _close_oldest_parked(self):
+        """Close the longest idle parked connection; returns False if none is parked"""
+        with self._parked_lock:
+            if not self._parked:
+                return False
+            request, (_, handler, _) = self._parked.popitem(last=False)
+            self._selector.unregister(request)
+        self._close_parked(request, handler)
+        return True
+
+    def _close_parked(self, request, handler):
+        try:
+            handler.close_parked()
+        except OSError:
+            pass
+        self.shutdown_request(request)
+        self._slots.release()
+
+    def _reject(self, request):
+        try:
+            request.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                            b"Content-Length: 0\r\n"
+                            b"Retry-After: 1\r\n"
+                            b"Connection: close\r\n\r\n")
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        with self._parked_lock:
+            self._closing = True
+            parked = list(self._parked.items())
+            self._parked.clear()
+            for request, _ in parked:
+                self._selector.unregister(request)
+        self._wake()
+        self._keepalive.join()
+        for request, (_, handler, _) in parked:
+            self._close_parked(request, handler)
+        self._pool.shutdown(wait=True)
+        self._selector.close()
+        self._wakeup.close()
+        self._wakeup_writer.close()
+
+def create_server(args, listener=None):
+    """Build the HTTP server for the serving mode selected on the command line.
+
+    listener is an already bound and listening socket (inherited from the
+    prefork supervisor) to serve on instead of binding a new one.
+    """
+    address = (args.bind, args.port)
+    if args.mode == 'single':
+        httpd = SingleHTTPServer(address, SingleSPAHandler, reuse_port=args.reuse_port,
+                                 bind_and_activate=listener is None)
+    else:
+        httpd = PooledHTTPServer(address, SPAHandler,
+                                 workers=args.workers,
+                                 max_connections=args.max_connections,
+                                 backlog=args.backlog,
+                                 reuse_port=args.reuse_port,
+                                 bind_and_activate=listener is None)
+    if listener is not None:
+        httpd.socket.close()
+        httpd.socket = listener
+        httpd.server_address = listener.getsockname()
+    return httpd
+
+def serve(args, listener=None):
+    """Run one serving process until interrupted"""
+    SPAHandler.manifest.start_polling()
+    if SPAHandler.access_log is not None:
+        SPAHandler.access_log.start()
+    try:
+        with create_server(args, listener) as httpd:
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        if SPAHandler.access_log is not None:
+            SPAHandler.access_log.close()
+
+class PreforkSupervisor:
+    """Forks worker processes that share the listening port and keeps them running.
+
+    Workers either inherit one listening socket from the supervisor or, with
+    reuse_port, each bind their own socket with SO_REUSEPORT so the kernel
+    spreads connections between them. A worker that dies is replaced; SIGTERM
+    or SIGINT stops every worker, letting in-flight requests finish first.
+    """
+
+    # A worker exiting sooner than this after its start is treated as a crash loop
+    min_worker_uptime = 1.0
+    shutdown_timeout = 10.0
+
+    def __init__(self, args):
+        self.args = args
+        self.listener = None
+        self.workers = {}
+        self.slots = {}
+        self.stopping = False
+
+    def run(self):
+        if not hasattr(os, 'fork'):
+            raise SystemExit("Error: --processes requires a platform with os.fork()")
+        if not self.args.reuse_port:
+            self.listener = socket.create_server((self.args.bind, self.args.port),
+                                                 backlog=self.args.backlog)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.args.processes):
+            self._spawn(slot)
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self.workers.pop(pid, None)
+            slot = self.slots.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            if time.monotonic() - started < self.min_worker_uptime:
+                time.sleep(self.min_worker_uptime)
+            if not self.stopping:
+                self._spawn(slot)
+
+        if self.listener is not None:
+            self.listener.close()
+
+    def _spawn(self, slot):
+        if SPAHandler.metrics is not None:
+            # A worker that was killed never closed its connections
+            SPAHandler.metrics.reset_gauges(slot)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                if SPAHandler.metrics is not None:
+                    SPAHandler.metrics.bind_slot(slot)
+                # Only the supervisor reacts to Ctrl+C; workers wait for its SIGTERM
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+                serve(self.args, self.listener)
+            except SystemExit as e:
+                code = e.code or 0
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        self.slots[pid] = slot
+
+    def _stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # Give workers time to drain, then make sure none are left behind
+        timer = threading.Timer(self.shutdown_timeout, self._kill_remaining)
+        timer.daemon = True
+        timer.start()
+
+    def _kill_remaining(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Serve the Flutter web build as a single page application")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument("--directory", help="Web root to serve (default: build/web next to this script)")
+    parser.add_argument("--bind", default="", help="Address to bind to (default: all interfaces)")
+    parser.add_argument("--mode", choices=["threaded", "single"], default="threaded",
+                        help="Serving mode: bounded thread pool or one request at a time (default: threaded)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Worker processes forked by a supervisor, each with its own "
+                             "thread pool (default: 1, no supervisor)")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="With --processes, let each worker bind the port itself with "
+                             "SO_REUSEPORT instead of inheriting the supervisor's socket")
+    parser.add_argument("--workers", type=int, default=32,
+                        help="Worker threads in threaded mode (default: 32)")
+    parser.add_argument("--max-connections", type=int, default=256,
+                        help="Connections held open at once before new ones get 503 (default: 256)")
+    parser.add_argument("--backlog", type=int, default=128,
+                        help="Listen backlog for pending connections (default: 128)")
+    parser.add_argument("--keepalive-timeout", type=float, default=5,
+                        help="Seconds an idle persistent connection is kept open (default: 5)")
+    parser.add_argument("--keepalive-requests", type=int, default=100,
+                        help="Requests served on one connection before it is closed (default: 100)")
+    parser.add_argument("--cache-size-mb", type=int, default=128,
+                        help="Memory for cached assets and their compressed variants, 0 disables (default: 128)")
+    parser.add_argument("--cache-max-file-mb", type=int, default=16,
+                        help="Largest file kept in the asset cache (default: 16)")
+    parser.add_argument("--fallback", default="index.html",
+                        help="Document served for client-side routes (default: index.html)")
+    parser.add_argument("--manifest-refresh", type=float, default=2.0,
+                        help="Seconds between rescans of the web root, 0 disables (default: 2)")
+    parser.add_argument("--metrics-path", default="/__metrics",
+                        help="Path of the Prometheus metrics endpoint, empty disables metrics "
+                             "(default: /__metrics)")
+    parser.add_argument("--access-log", default="-",
+                        help="Access log file, '-' for stderr or 'off' to disable (default: -)")
+    parser.add_argument("--access-log-format", choices=["common", "json"], default="common",
+                        help="Access log line format (default: common)")
+    parser.add_argument("--access-log-max-mb", type=int, default=0,
+                        help="Rotate the access log file at this size, 0 disables (default: 0)")
+    parser.add_argument("--access-log-backups", type=int, default=5,
+                        help="Rotated access log files to keep (default: 5)")
+    parser.add_argument("--access-log-queue", type=int, default=10000,
+                        help="Records buffered before new ones are dropped (default: 10000)")
+    parser.add_argument("--max-age", type=int, default=0,
+                        help="Cache lifetime in seconds for assets without a content hash in "
+                             "their name, 0 means always revalidate (default: 0)")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
     # Change to the web build directory
-    web_dir = os.path.join(os.path.dirname(__file__), 'build', 'web')
+    web_dir = args.directory or os.path.join(os.path.dirname(__file__), 'build', 'web')
     if os.path.exists(web_dir):
         os.chdir(web_dir)
         print(f"Serving from: {web_dir}")
     else:
         print(f"Warning: {web_dir} not found, serving from current directory")
-    
-    with socketserver.TCPServer(("", PORT), SPAHandler) as httpd:
-        print(f"Flutter web app serving at http://localhost:{PORT}")
+
+    SPAHandler.timeout = args.keepalive_timeout
+    SPAHandler.max_keepalive_requests = args.keepalive_requests
+    # Scanned once here so forked workers start with the index already built
+    SPAHandler.manifest = AssetManifest(os.getcwd(), args.fallback, args.manifest_refresh,
+                                        args.max_age)
+
+    if args.cache_size_mb > 0:
+        SPAHandler.asset_cache = AssetCache(args.cache_size_mb * 1024 * 1024,
+                                            args.cache_max_file_mb * 1024 * 1024)
+
+    if args.access_log == 'off':
+        SPAHandler.log_requests = False
+    else:
+        SPAHandler.access_log = AccessLog(None if args.access_log == '-' else args.access_log,
+                                          args.access_log_format,
+                                          queue_size=args.access_log_queue,
+                                          max_bytes=args.access_log_max_mb * 1024 * 1024,
+                                          backup_count=args.access_log_backups)
+
+    if args.metrics_path:
+        # Allocated before forking so every worker shares the same counters
+        SPAHandler.metrics = ServerMetrics(max(args.processes, 1))
+        SPAHandler.metrics_path = args.metrics_path
+
+    if args.processes > 1:
+        print(f"Flutter web app serving at http://localhost:{args.port} "
+              f"({args.processes} processes, {args.mode} mode)")
         print("Press Ctrl+C to stop the server")
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\nServer stopped.")
\ No newline at end of file
+        PreforkSupervisor(args).run()
+    else:
+        print(f"Flutter web app serving at http://localhost:{args.port} ({args.mode} mode)")
+        print("Press Ctrl+C to stop the server")
+        serve(args)
+    print("\nServer stopped.")
+
+if __name__ == '__main__':
+    main()
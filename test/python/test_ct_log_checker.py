@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the incremental JSON array parser and source fan-out in ct_log_checker.py
+
+Usage:
+  python -m unittest discover -s test/python
+
+Requirements:
+  - Python 3.7+
+  - requests library (imported by ct_log_checker.py)
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(REPO_ROOT, "test_scripts"))
+
+from ct_log_checker import CTSource, fetch_all, iter_json_array  # noqa: E402
+
+# Every kind of element, including numbers and literals that can be cut in two
+SAMPLE = [
+    {"id": 12345678901, "issuer_name": "C=US, O=Let's Encrypt, CN=R3", "name_value": "a.example\nb.example"},
+    -17, 0, 12.5, 1.5e3, -2.25E-4, True, False, None,
+    "café 漢字 \U0001F512", "", [], {}, [1, [2, [3]]], {"nested": {"empty": []}},
+]
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+class IterJsonArrayTest(unittest.TestCase):
+
+    def parse(self, chunks):
+        return list(iter_json_array(chunks))
+
+    def test_whole_array_in_one_chunk(self):
+        self.assertEqual(self.parse([json.dumps(SAMPLE).encode()]), SAMPLE)
+
+    def test_every_two_chunk_split(self):
+        data = json.dumps(SAMPLE, ensure_ascii=False).encode("utf-8")
+        for i in range(len(data) + 1):
+            with self.subTest(split=i):
+                self.assertEqual(self.parse([data[:i], data[i:]]), SAMPLE)
+
+    def test_every_chunk_size(self):
+        data = json.dumps(SAMPLE, ensure_ascii=False).encode("utf-8")
+        for size in (1, 2, 3, 5, 7, 64):
+            with self.subTest(size=size):
+                self.assertEqual(self.parse(chunked(data, size)), SAMPLE)
+
+    def test_numbers_split_inside_the_literal(self):
+        self.assertEqual(self.parse([b"[1", b"2, 12.", b"5, 1e", b"3, -", b"4]"]), [12, 12.5, 1000.0, -4])
+        self.assertEqual(self.parse([b"[tr", b"ue, nu", b"ll]"]), [True, None])
+
+    def test_utf8_sequence_split_between_chunks(self):
+        data = '["\U0001F512"]'.encode("utf-8")
+        for i in range(3, 6):
+            with self.subTest(split=i):
+                self.assertEqual(self.parse([data[:i], data[i:]]), ["\U0001F512"])
+
+    def test_empty_arrays_whitespace_and_empty_chunks(self):
+        self.assertEqual(self.parse([b"[]"]), [])
+        self.assertEqual(self.parse([b"", b" \n[ ", b"", b"\t]\r\n"]), [])
+        self.assertEqual(self.parse([b"[ 1 ,\n 2 ]"]), [1, 2])
+
+    def test_elements_are_yielded_before_the_array_ends(self):
+        items = iter_json_array(iter([b'[{"id": 1}, ', b'{"id": 2}, ']))
+        self.assertEqual(next(items), {"id": 1})
+        self.assertEqual(next(items), {"id": 2})
+        with self.assertRaises(json.JSONDecodeError):
+            next(items)
+
+    def test_not_an_array(self):
+        for data in (b'{"id": 1}', b"1", b'"text"', b"<html>"):
+            with self.subTest(data=data):
+                with self.assertRaises(json.JSONDecodeError):
+                    self.parse([data])
+
+    def test_truncated_array(self):
+        data = json.dumps(SAMPLE).encode()
+        for i in range(len(data)):
+            with self.subTest(length=i):
+                with self.assertRaises(json.JSONDecodeError):
+                    self.parse([data[:i]])
+
+    def test_malformed_element(self):
+        for data in (b"[1, }, 2]", b'[{"id": 1,}]', b"[tru]", b"[1.2.3]", b"[undefined]"):
+            with self.subTest(data=data):
+                with self.assertRaises(json.JSONDecodeError) as raised:
+                    self.parse(chunked(data, 3))
+                self.assertNotIn("Unterminated JSON array", str(raised.exception))
+
+class FakeSource(CTSource):
+    """Yields count records, then raises if fail is set; records whether fetch() was closed"""
+
+    def __init__(self, name, count, fail=False):
+        super().__init__(None)
+        self.name = name
+        self.count = count
+        self.fail = fail
+        self.closed = threading.Event()
+
+    def fetch(self, domain, client, verbose=False):
+        try:
+            for i in range(self.count):
+                yield {"id": f"{self.name}-{i}"}
+            if self.fail:
+                raise RuntimeError("boom")
+        finally:
+            self.closed.set()
+
+class FetchAllTest(unittest.TestCase):
+
+    def fetch(self, sources):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            records = list(fetch_all("example.com", sources, None, batch_size=4))
+        return records, output.getvalue()
+
+    def test_records_of_every_source(self):
+        records, _ = self.fetch([FakeSource("a", 10), FakeSource("b", 7)])
+        self.assertEqual(sorted(r["id"] for r in records),
+                         sorted([f"a-{i}" for i in range(10)] + [f"b-{i}" for i in range(7)]))
+
+    def test_failing_source_is_reported_and_skipped(self):
+        for sources in ([FakeSource("a", 3, fail=True)],
+                        [FakeSource("a", 3, fail=True), FakeSource("b", 2)]):
+            with self.subTest(sources=len(sources)):
+                records, output = self.fetch(sources)
+                self.assertEqual(len(records), 3 + 2 * (len(sources) - 1))
+                self.assertIn("a query for example.com failed: boom", output)
+
+    def test_closing_early_stops_the_pumps(self):
+        sources = [FakeSource("a", 100000), FakeSource("b", 100000)]
+        records = fetch_all("example.com", sources, None, batch_size=4, put_timeout=0.01)
+        next(records)
+        records.close()
+        for source in sources:
+            self.assertTrue(source.closed.wait(5), f"{source.name} was never closed")
+
+if __name__ == "__main__":
+    unittest.main()
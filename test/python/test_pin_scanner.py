@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the DER walk and pin matching in pin_scanner.py
+
+The fixture certificates in fixtures/ are copies kept apart from the ones
+the shell scripts regenerate; their expected pins were computed with
+  openssl x509 -in CERT -noout -pubkey | openssl pkey -pubin -outform der |
+      openssl dgst -sha256 -binary | base64
+
+Usage:
+  python -m unittest discover -s test/python
+
+Requirements:
+  - Python 3.7+
+"""
+
+import base64
+import hashlib
+import os
+import ssl
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(REPO_ROOT, "test_scripts"))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+from pin_scanner import certificate_pins, extract_spki, match_pins, normalize_fingerprint  # noqa: E402
+
+# Certificate file -> SPKI pin from openssl
+FIXTURE_PINS = {
+    "invalid_example_cert.pem": "YWIr3kHjpGhBDCNYQeCIojAOaVx38fKOtp8iu6N//qs=",
+    "server_cert.pem": "RhKPhUt34qSWDMKCAd37/UUNUV0tOhZ2EYbpRKGPDbo=",
+    "staging_cert.pem": "D44+jvH6roHl1e12+A9iAXm6f5hm4IISbhOq/BJ7WzQ=",
+}
+
+def load_der(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return ssl.PEM_cert_to_DER_cert(f.read())
+
+def der(tag, content):
+    """Encode one DER element, with a long-form length when needed"""
+    if len(content) < 0x80:
+        return bytes([tag, len(content)]) + content
+    length = len(content).to_bytes((len(content).bit_length() + 7) // 8, "big")
+    return bytes([tag, 0x80 | len(length)]) + length + content
+
+def certificate(spki, version=True, subject=b"test"):
+    """A structurally valid certificate around spki (signatures are not checked)"""
+    name = der(0x30, der(0x31, der(0x30, der(0x06, b"\x55\x04\x03") + der(0x0C, subject))))
+    fields = [
+        der(0x02, b"\x01"),  # serialNumber
+        der(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x01\x0b")),  # signature
+        name,  # issuer
+        der(0x30, der(0x17, b"250101000000Z") + der(0x17, b"260101000000Z")),  # validity
+        name,  # subject
+        spki,
+    ]
+    if version:
+        fields.insert(0, der(0xA0, der(0x02, b"\x02")))
+    tbs = der(0x30, b"".join(fields))
+    return der(0x30, tbs + der(0x30, der(0x06, b"\x2a")) + der(0x03, b"\x00sig"))
+
+def spki_of_size(key_bytes):
+    algorithm = der(0x30, der(0x06, b"\x2a\x86\x48\xce\x3d\x02\x01"))  # id-ecPublicKey
+    return der(0x30, algorithm + der(0x03, b"\x00" + b"\x04" * key_bytes))
+
+class ExtractSpkiTest(unittest.TestCase):
+
+    def test_fixture_certificates_match_openssl(self):
+        for name, pin in FIXTURE_PINS.items():
+            with self.subTest(certificate=name):
+                self.assertEqual(certificate_pins(load_der(name))["spki_sha256"], pin)
+
+    def test_certificate_fingerprint_is_sha256_of_the_der(self):
+        cert = load_der("invalid_example_cert.pem")
+        self.assertEqual(certificate_pins(cert)["cert_sha256"], hashlib.sha256(cert).hexdigest())
+
+    def test_version_field_is_optional(self):
+        spki = spki_of_size(65)
+        self.assertEqual(extract_spki(certificate(spki, version=True)), spki)
+        self.assertEqual(extract_spki(certificate(spki, version=False)), spki)
+
+    def test_short_and_long_form_lengths(self):
+        # 127 and 128 bytes straddle the short/long form boundary; 300 needs two length bytes
+        for key_bytes in (10, 120, 127, 128, 300, 70000):
+            spki = spki_of_size(key_bytes)
+            with self.subTest(key_bytes=key_bytes):
+                self.assertEqual(extract_spki(certificate(spki, subject=b"x" * key_bytes)), spki)
+
+    def test_truncated_certificates_raise_value_error(self):
+        cert = load_der("server_cert.pem")
+        for length in range(len(cert)):
+            with self.subTest(length=length):
+                with self.assertRaises(ValueError):
+                    extract_spki(cert[:length])
+
+    def test_not_a_certificate(self):
+        spki = spki_of_size(65)
+        for data in (b"", b"\x02\x01\x01", der(0x30, der(0x02, b"\x01")),
+                     certificate(der(0x04, b"not a sequence")),
+                     b"\x30\x80\x00\x00",  # indefinite length
+                     b"\x30\x85" + b"\x00" * 8,  # five length bytes
+                     certificate(spki)[:1] + b"\x84\xff\xff\xff\xff"):
+            with self.subTest(data=data[:16]):
+                with self.assertRaises(ValueError):
+                    extract_spki(data)
+
+class PinMatchingTest(unittest.TestCase):
+
+    def test_normalize_fingerprint_forms(self):
+        digest = hashlib.sha256(b"key").digest()
+        hex_form = digest.hex()
+        b64 = base64.b64encode(digest).decode()
+        for value in (b64, "sha256/" + b64, hex_form, hex_form.upper(),
+                      ":".join(hex_form[i:i + 2] for i in range(0, 64, 2)), f"  {b64}\n"):
+            with self.subTest(value=value):
+                self.assertEqual(normalize_fingerprint(value), hex_form)
+        for value in (None, "", "not a pin", base64.b64encode(b"short").decode(), hex_form[:-2]):
+            with self.subTest(value=value):
+                self.assertIsNone(normalize_fingerprint(value))
+
+    def test_match_pins_prefers_primary_and_reports_position(self):
+        leaf = certificate_pins(load_der("server_cert.pem"))
+        issuer = certificate_pins(load_der("staging_cert.pem"))
+        chain = [leaf, issuer]
+        self.assertEqual(match_pins(chain, {"primary": leaf["spki_sha256"]}), ("primary", "leaf", "spki"))
+        self.assertEqual(match_pins(chain, {"primary": "sha256/AAAA", "backup": issuer["cert_sha256"]}),
+                         ("backup", "chain[1]", "certificate"))
+        self.assertIsNone(match_pins(chain, {"primary": FIXTURE_PINS["invalid_example_cert.pem"], "backup": ""}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Range header parsing, Cache-Control policy and metrics in server.py
+
+Usage:
+  python -m unittest discover -s test/python
+
+Requirements:
+  - Python 3.9+
+"""
+
+import os
+import re
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from server import MAX_RANGES, ServerMetrics, cache_control_for, parse_byte_ranges  # noqa: E402
+
+class ParseByteRangesTest(unittest.TestCase):
+
+    def test_absent_header_means_whole_body(self):
+        self.assertIsNone(parse_byte_ranges(None, 1000))
+        self.assertIsNone(parse_byte_ranges("", 1000))
+
+    def test_single_ranges(self):
+        cases = {
+            "bytes=0-99": [(0, 99)],
+            "bytes=500-": [(500, 999)],
+            "bytes=-200": [(800, 999)],
+            "bytes=999-999": [(999, 999)],
+            "Bytes=0-0": [(0, 0)],
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_byte_ranges(header, 1000), expected)
+
+    def test_ranges_are_clamped_to_the_body(self):
+        self.assertEqual(parse_byte_ranges("bytes=900-2000", 1000), [(900, 999)])
+        self.assertEqual(parse_byte_ranges("bytes=-5000", 1000), [(0, 999)])
+
+    def test_multiple_ranges_keep_their_order(self):
+        self.assertEqual(parse_byte_ranges("bytes=500-599, 0-99,-10", 1000),
+                         [(500, 599), (0, 99), (990, 999)])
+
+    def test_empty_list_elements_are_ignored(self):
+        self.assertEqual(parse_byte_ranges("bytes=0-1,, 2-3,", 1000), [(0, 1), (2, 3)])
+
+    def test_unsatisfiable_ranges(self):
+        # An empty list means 416 Range Not Satisfiable
+        self.assertEqual(parse_byte_ranges("bytes=1000-1100", 1000), [])
+        self.assertEqual(parse_byte_ranges("bytes=-0", 1000), [])
+        self.assertEqual(parse_byte_ranges("bytes=0-", 0), [])
+        self.assertEqual(parse_byte_ranges("bytes=-5", 0), [])
+
+    def test_satisfiable_ranges_survive_unsatisfiable_ones(self):
+        self.assertEqual(parse_byte_ranges("bytes=2000-3000,0-9", 1000), [(0, 9)])
+
+    def test_malformed_headers_are_ignored(self):
+        for header in ("items=0-1", "bytes", "bytes=", "bytes=-", "bytes=5", "bytes=a-b",
+                       "bytes=5-2", "bytes=--5", "bytes=+5-10", "bytes=0x1-2", "bytes=1-2-3",
+                       "bytes=١-٢", "bytes=0-1,x"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_byte_ranges(header, 1000))
+
+    def test_too_many_ranges(self):
+        allowed = ",".join(f"{i}-{i}" for i in range(MAX_RANGES))
+        self.assertEqual(len(parse_byte_ranges("bytes=" + allowed, 1000)), MAX_RANGES)
+        self.assertIsNone(parse_byte_ranges(f"bytes={allowed},{MAX_RANGES}-{MAX_RANGES}", 1000))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+class CacheControlTest(unittest.TestCase):
+
+    def test_content_hashed_names_are_immutable(self):
+        for url in ("/main.3f9a2c1d0b7e4a65.js", "/assets/chunk-0123456789abcdef0123.wasm"):
+            with self.subTest(url=url):
+                self.assertEqual(cache_control_for(url), IMMUTABLE)
+
+    def test_dates_numbers_and_short_hashes_are_not_immutable(self):
+        for url in ("/report-20240101.json", "/-12345678.json", "/data.1234567890123456.json",
+                    "/main.3f9a2c1d.js", "/main.dart.js"):
+            with self.subTest(url=url):
+                self.assertEqual(cache_control_for(url), "no-cache")
+                self.assertEqual(cache_control_for(url, max_age=60), "public, max-age=60")
+
+    def test_bootstrap_files_are_always_revalidated(self):
+        for url in ("/index.html", "/flutter_service_worker.js", "/version.json"):
+            with self.subTest(url=url):
+                self.assertEqual(cache_control_for(url, max_age=60), "no-cache")
+
+class FakeCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+def metric(metrics, name):
+    return float(re.search(rf"^{name} (\S+)$", metrics.render(), re.M).group(1))
+
+class ServerMetricsTest(unittest.TestCase):
+
+    def test_counters_stay_monotonic_when_a_row_is_reused(self):
+        metrics = ServerMetrics(processes=2)
+        metrics.bind_slot(1)
+        cache = FakeCache()
+        cache.hits, cache.misses = 5, 2
+        metrics.connection_opened()
+        metrics.record("asset", 200, 0.001, 10, asset_cache=cache)
+        self.assertEqual(metric(metrics, "spa_asset_cache_hits_total"), 5)
+
+        # The worker is killed and a new process takes over the same row,
+        # with its own cache counting from zero
+        metrics.reset_gauges(1)
+        metrics.bind_slot(1)
+        cache = FakeCache()
+        cache.hits = 1
+        metrics.record("asset", 200, 0.001, 10, asset_cache=cache)
+        self.assertEqual(metric(metrics, "spa_asset_cache_hits_total"), 6)
+        self.assertEqual(metric(metrics, "spa_asset_cache_misses_total"), 2)
+        self.assertEqual(metric(metrics, "spa_connections_in_flight"), 0)
+        self.assertEqual(metric(metrics, "spa_response_bytes_total"), 20)
+
+        cache.hits = 4
+        metrics.record("asset", 200, 0.001, 10, asset_cache=cache)
+        self.assertEqual(metric(metrics, "spa_asset_cache_hits_total"), 9)
+
+if __name__ == "__main__":
+    unittest.main()
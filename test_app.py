@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
 import requests
 import time
+from collections import defaultdict
+from datetime import datetime
 
-def test_flutter_app():
-    base_url = "http://localhost:8080"
-    
+# The shared instrumentation module lives with the other ops tools
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_scripts"))
+import ops_instrumentation  # noqa: E402
+from ops_instrumentation import tracer  # noqa: E402
+
+# Default load mix: relative weight of each route or asset in a replayed page load
+DEFAULT_MIX = "/=4,/login=2,/dashboard=2,/main.dart.js=3,/flutter_bootstrap.js=3,/assets/fonts/MaterialIcons-Regular.otf=1"
+
+def test_flutter_app(base_url="http://localhost:8080"):
     print("Testing Flutter web app...")
     
     # Test main page
@@ -44,5 +59,205 @@ def test_flutter_app():
         except Exception as e:
             print(f"Error testing {route}: {e}")
 
+def parse_mix(mix):
+    """Parse "path=weight,path=weight" into a list of (path, weight)"""
+    paths = []
+    for item in mix.split(","):
+        path, _, weight = item.strip().partition("=")
+        if path:
+            paths.append((path, float(weight) if weight else 1.0))
+    return paths
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct * len(sorted_values) / 100.0) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+class LoadGenerator:
+    """Replays a weighted mix of routes and assets against the server.
+
+    Each of `concurrency` threads keeps its own pooled keep-alive session. With
+    a target rate the threads share one send schedule (open loop) and latency
+    is measured from each request's scheduled start, so time spent queued
+    behind slow responses counts (no coordinated omission); without one every
+    thread sends its next request as soon as the previous one finished.
+    """
+
+    def __init__(self, base_url, mix, concurrency=10, rate=0, duration=10, max_requests=0,
+                 timeout=10, seed=None):
+        self.base_url = base_url.rstrip("/")
+        self.paths = [path for path, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._results = []
+
+    def _next_slot(self):
+        """Reserve the next request; returns its scheduled start or None when done"""
+        with self._lock:
+            if self.max_requests and self._issued >= self.max_requests:
+                return None
+            index = self._issued
+            self._issued += 1
+        if self.rate > 0:
+            return self._started + index / self.rate
+        return time.perf_counter()
+
+    def _worker(self, worker_id):
+        rng = random.Random(None if self.seed is None else self.seed + worker_id)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        results = []
+        while True:
+            scheduled = self._next_slot()
+            if scheduled is None or scheduled >= self._deadline:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            path = rng.choices(self.paths, self.weights)[0]
+            sent = time.perf_counter()
+            # Open loop: a request sent late because every worker was busy is late
+            started = scheduled if self.rate > 0 else sent
+            status, size, error = None, 0, None
+            try:
+                response = session.get(self.base_url + path, timeout=self.timeout, stream=True)
+                body = response.content
+                status = response.status_code
+                # Bytes on the wire, before any Content-Encoding is decoded
+                size = response.raw.tell() or len(body)
+            except requests.exceptions.RequestException as e:
+                error = type(e).__name__
+            finished = time.perf_counter()
+            tracer.record_call(f"GET {path}", sent, finished - sent, status=status, bytes=size, error=error)
+            results.append((path, started - self._started, finished - started, status, size, error))
+        session.close()
+        with self._lock:
+            self._results.extend(results)
+
+    def run(self):
+        self._started = time.perf_counter()
+        self._deadline = self._started + self.duration if self.duration else float("inf")
+        threads = [threading.Thread(target=self._worker, args=(i,), daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - self._started)
+
+    def report(self, elapsed):
+        """Summarise the collected results as a JSON-serialisable dict"""
+        def summarize(results):
+            latencies = sorted(r[2] for r in results)
+            errors = sum(1 for r in results if r[5] is not None or r[3] is None or r[3] >= 400)
+            statuses = defaultdict(int)
+            for r in results:
+                statuses[str(r[3]) if r[3] is not None else r[5]] += 1
+            ms = lambda value: None if value is None else round(value * 1000, 3)
+            return {
+                "requests": len(results),
+                "errors": errors,
+                "error_rate": round(errors / len(results), 4) if results else 0.0,
+                "bytes": sum(r[4] for r in results),
+                "status_codes": dict(statuses),
+                "latency_ms": {
+                    "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+                    "p50": ms(percentile(latencies, 50)),
+                    "p90": ms(percentile(latencies, 90)),
+                    "p99": ms(percentile(latencies, 99)),
+                    "max": ms(latencies[-1]) if latencies else None,
+                },
+            }
+
+        by_path = defaultdict(list)
+        for r in self._results:
+            by_path[r[0]].append(r)
+        overall = summarize(self._results)
+        overall.update({
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(len(self._results) / elapsed, 2) if elapsed else 0.0,
+            "throughput_bytes_per_s": round(overall["bytes"] / elapsed) if elapsed else 0,
+        })
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "base_url": self.base_url,
+            "concurrency": self.concurrency,
+            "target_rate_rps": self.rate or None,
+            "overall": overall,
+            "paths": {path: summarize(results) for path, results in sorted(by_path.items())},
+        }
+
+def print_report(report):
+    overall = report["overall"]
+    latency = overall["latency_ms"]
+    print(f"\nLoad test against {report['base_url']} "
+          f"({report['concurrency']} workers, {overall['duration_s']}s)")
+    print(f"  Requests:    {overall['requests']} ({overall['throughput_rps']} req/s)")
+    print(f"  Errors:      {overall['errors']} ({overall['error_rate'] * 100:.2f}%)")
+    print(f"  Transferred: {overall['bytes']} bytes ({overall['throughput_bytes_per_s']} bytes/s)")
+    print(f"  Latency ms:  p50={latency['p50']} p90={latency['p90']} "
+          f"p99={latency['p99']} max={latency['max']}")
+    for path, summary in report["paths"].items():
+        latency = summary["latency_ms"]
+        print(f"  {path}: {summary['requests']} requests, {summary['errors']} errors, "
+              f"p50={latency['p50']}ms p99={latency['p99']}ms")
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Smoke test or load test the Flutter web server")
+    parser.add_argument("--url", default="http://localhost:8080", help="Base URL of the server")
+    parser.add_argument("--load", action="store_true",
+                        help="Run a concurrent load test instead of the route smoke test")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="Weighted paths to replay as path=weight,... (default: a Flutter page load)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent workers (default: 10)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Target requests per second across all workers, 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="Seconds to run, 0 to stop only at --requests (default: 10)")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="Stop after this many requests, 0 for no limit (default: 0)")
+    parser.add_argument("--timeout", type=float, default=10, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Seed for the path mix, for repeatable runs")
+    parser.add_argument("--output-json", help="Path to write the load test report as JSON")
+    ops_instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    if not args.load:
+        ops_instrumentation.start_from_args(args, "test_app")
+        with tracer.phase("smoke test"):
+            test_flutter_app(args.url)
+        tracer.finish()
+        return 0
+    if not args.duration and not args.requests:
+        print("Error: --duration 0 needs a --requests limit")
+        return 2
+
+    ops_instrumentation.start_from_args(args, "test_app")
+    generator = LoadGenerator(args.url, parse_mix(args.mix), args.concurrency, args.rate,
+                              args.duration, args.requests, args.timeout, args.seed)
+    with tracer.phase("load test", concurrency=args.concurrency, rate=args.rate):
+        report = generator.run()
+    print_report(report)
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nJSON report written to {args.output_json}")
+    tracer.finish()
+    return 1 if report["overall"]["errors"] else 0
+
 if __name__ == "__main__":
-    test_flutter_app()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
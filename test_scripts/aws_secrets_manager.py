@@ -5,28 +5,381 @@ AWS Secrets Manager Integration for Certificate Fingerprint Backup Storage
 This script provides functionality to store, retrieve, and manage certificate fingerprints
 in AWS Secrets Manager as a secure backup solution.
 
+With --backend local the same commands run against a SQLite file instead, with
+the same semantics (including the 7-day recovery window on delete), so the
+tool can be used and measured on hosts without AWS access.
+
 Requirements:
   - Python 3.6+
-  - boto3 library (pip install boto3)
+  - boto3 library (pip install boto3; 1.34.25+ for batched export), not needed for --backend local
   - AWS credentials configured (via environment variables, ~/.aws/credentials, or IAM role)
 
 Usage:
-  python aws_secrets_manager.py [command] [arguments]
+  python aws_secrets_manager.py [--cache-file cache.sqlite] [--cache-ttl 300] [command] [arguments]
+  python aws_secrets_manager.py --trace trace.json [--profile cprofile] [command] [arguments]
+  python aws_secrets_manager.py --backend local [--local-db fingerprints.sqlite] [command] [arguments]
 """
 
 import argparse
+import hashlib
 import json
+import os
+import sqlite3
 import sys
-import boto3
-from botocore.exceptions import ClientError
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import ops_instrumentation
+from ops_instrumentation import tracer
+
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    # Only the local backend is available without boto3
+    boto3 = None
+    Config = None
+
+    class ClientError(Exception):
+        def __init__(self, error_response, operation_name):
+            self.response = error_response
+            self.operation_name = operation_name
+            error = error_response.get('Error', {})
+            super().__init__(f"An error occurred ({error.get('Code')}) when calling the "
+                             f"{operation_name} operation: {error.get('Message')}")
 
 # Configuration
 SECRET_NAME_PREFIX = "certificate-fingerprints"
 REGION_NAME = "us-east-1"  # Change to your AWS region
+IMPORT_WORKERS = 8  # Parallel requests during import
+BATCH_GET_SIZE = 20  # Most secrets BatchGetSecretValue returns per call
+BATCH_GET_DENIED = ("AccessDeniedException",)  # Error codes that fall back to GetSecretValue
+CACHE_TTL = 300  # Seconds a retrieved fingerprint set is reused, 0 disables caching
+CACHE_MAX_ENTRIES = 4096  # Domains kept in the in-process cache
+BACKEND = "aws"  # "aws" for Secrets Manager, "local" for LOCAL_DB
+LOCAL_DB = "~/.certificate-fingerprints.sqlite"
+
+# Adaptive retries back off client-side when Secrets Manager throttles us
+CLIENT_RETRIES = {'max_attempts': 10, 'mode': 'adaptive'}
+
+_client = None
+_client_workers = IMPORT_WORKERS  # Threads sharing the client, set by configure_backend
+_client_lock = threading.Lock()
+
+# Open a SQLite file that holds fingerprints, creating it owner-only like ~/.aws/credentials
+def open_private_db(path, **kwargs):
+    path = os.path.expanduser(path)
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    return sqlite3.connect(path, check_same_thread=False, **kwargs)
+
+# Local stand-in for the subset of the Secrets Manager client this script uses.
+# Secrets live in one SQLite table keyed by name, so prefix listing is an index
+# range scan; errors are raised as ClientErrors with the AWS error codes, so
+# every command behaves the same on both backends.
+class LocalSecretsClient:
+    def __init__(self, path):
+        self._db = open_private_db(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS secrets (
+                name TEXT PRIMARY KEY,
+                secret_string TEXT NOT NULL,
+                description TEXT,
+                version_id TEXT NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                deleted_at REAL,
+                purge_at REAL
+            )""")
+        self._lock = threading.RLock()
+        self._depth = 0
+    
+    # Group writes into one SQLite transaction; rolled back if the block raises
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth == 0:
+                self._db.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._db.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._db.execute("COMMIT")
+    
+    @staticmethod
+    def _error(code, message, operation):
+        return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+    
+    # Fetch a secret's row, purging it first if its recovery window has passed
+    def _row(self, name):
+        row = self._db.execute("SELECT name, secret_string, version_id, created, deleted_at, purge_at "
+                               "FROM secrets WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[5] is not None and row[5] <= time.time():
+            self._db.execute("DELETE FROM secrets WHERE name = ?", (name,))
+            return None
+        return row
+    
+    def _live_row(self, name, operation):
+        row = self._row(name)
+        if row is None:
+            raise self._error('ResourceNotFoundException',
+                              "Secrets Manager can't find the specified secret.", operation)
+        if row[4] is not None:
+            raise self._error('InvalidRequestException',
+                              "You tried to perform the operation on a secret that's currently marked deleted.",
+                              operation)
+        return row
+    
+    def get_secret_value(self, SecretId):
+        with self._lock:
+            row = self._live_row(SecretId, 'GetSecretValue')
+        return {'Name': row[0], 'SecretString': row[1], 'VersionId': row[2],
+                'CreatedDate': datetime.fromtimestamp(row[3], timezone.utc)}
+    
+    def put_secret_value(self, SecretId, SecretString):
+        version_id = str(uuid.uuid4())
+        with self.transaction():
+            self._live_row(SecretId, 'PutSecretValue')
+            self._db.execute("UPDATE secrets SET secret_string = ?, version_id = ?, updated = ? WHERE name = ?",
+                             (SecretString, version_id, time.time(), SecretId))
+        return {'Name': SecretId, 'VersionId': version_id}
+    
+    def create_secret(self, Name, SecretString, Description=None):
+        version_id = str(uuid.uuid4())
+        now = time.time()
+        with self.transaction():
+            row = self._row(Name)
+            if row is not None and row[4] is not None:
+                raise self._error('InvalidRequestException',
+                                  "You can't create this secret because a secret with this name is already "
+                                  "scheduled for deletion.", 'CreateSecret')
+            if row is not None:
+                raise self._error('ResourceExistsException',
+                                  f"The operation failed because the secret {Name} already exists.", 'CreateSecret')
+            self._db.execute("INSERT INTO secrets (name, secret_string, description, version_id, created, updated) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", (Name, SecretString, Description, version_id, now, now))
+        return {'Name': Name, 'VersionId': version_id}
+    
+    def delete_secret(self, SecretId, RecoveryWindowInDays=30):
+        if not 7 <= RecoveryWindowInDays <= 30:
+            raise self._error('InvalidParameterException',
+                              "RecoveryWindowInDays must be between 7 and 30 days.", 'DeleteSecret')
+        now = time.time()
+        with self.transaction():
+            row = self._live_row(SecretId, 'DeleteSecret')
+            purge_at = now + RecoveryWindowInDays * 86400
+            self._db.execute("UPDATE secrets SET deleted_at = ?, purge_at = ? WHERE name = ?",
+                             (now, purge_at, row[0]))
+        return {'Name': SecretId, 'DeletionDate': datetime.fromtimestamp(purge_at, timezone.utc)}
+    
+    # Live secrets whose names start with prefix, in name order, after the name `after`
+    def _scan(self, prefix, after, limit):
+        # Every name with the prefix sorts in [prefix, prefix + U+10FFFF)
+        upper = prefix + chr(0x10FFFF)
+        with self._lock:
+            return self._db.execute(
+                "SELECT name, secret_string, version_id, created FROM secrets "
+                "WHERE name >= ? AND name < ? AND name > ? AND deleted_at IS NULL "
+                "AND (purge_at IS NULL OR purge_at > ?) ORDER BY name LIMIT ?",
+                (prefix, upper, after, time.time(), limit)).fetchall()
+    
+    @staticmethod
+    def _name_prefix(Filters):
+        for name_filter in Filters or []:
+            if name_filter.get('Key') == 'name' and name_filter.get('Values'):
+                return name_filter['Values'][0]
+        return ""
+    
+    def batch_get_secret_value(self, Filters=None, MaxResults=BATCH_GET_SIZE, NextToken=None):
+        rows = self._scan(self._name_prefix(Filters), NextToken or "", MaxResults)
+        page = {
+            'SecretValues': [{'Name': name, 'SecretString': value, 'VersionId': version,
+                              'CreatedDate': datetime.fromtimestamp(created, timezone.utc)}
+                             for name, value, version, created in rows],
+            'Errors': [],
+        }
+        if len(rows) == MaxResults:
+            page['NextToken'] = rows[-1][0]
+        return page
+    
+    def get_paginator(self, operation_name):
+        if operation_name != 'list_secrets':
+            raise ValueError(f"Operation cannot be paginated: {operation_name}")
+        return self
+    
+    # Stands in for the list_secrets paginator
+    def paginate(self, Filters=None, PageSize=100):
+        prefix = self._name_prefix(Filters)
+        after = ""
+        while True:
+            rows = self._scan(prefix, after, PageSize)
+            yield {'SecretList': [{'Name': row[0]} for row in rows]}
+            if len(rows) < PageSize:
+                return
+            after = rows[-1][0]
 
-# Initialize AWS Secrets Manager client
+# Initialize the Secrets Manager client (or its local stand-in), once per process (clients are thread-safe)
 def get_secrets_client():
-    return boto3.client('secretsmanager', region_name=REGION_NAME)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if BACKEND == "local":
+                    _client = LocalSecretsClient(LOCAL_DB)
+                elif boto3 is None:
+                    raise RuntimeError("boto3 is not installed; install it or use --backend local")
+                else:
+                    # One pooled connection per thread, so none is discarded and reopened
+                    config = Config(retries=CLIENT_RETRIES, max_pool_connections=max(_client_workers, 10))
+                    _client = boto3.client('secretsmanager', region_name=REGION_NAME, config=config)
+                    trace_client_calls(_client)
+    return _client
+
+# Time every Secrets Manager API call through botocore's event hooks, when tracing is on
+def trace_client_calls(client):
+    if not tracer.enabled:
+        return
+    
+    def before_call(context, **kwargs):
+        context['trace_started'] = time.perf_counter()
+    
+    def after_call(model, http_response, parsed, context, **kwargs):
+        started = context.get('trace_started')
+        if started is None:
+            return
+        metadata = parsed.get('ResponseMetadata', {}) if isinstance(parsed, dict) else {}
+        error = parsed.get('Error', {}).get('Code') if isinstance(parsed, dict) else None
+        tracer.record_call(model.name, started, time.perf_counter() - started,
+                           status=getattr(http_response, 'status_code', None),
+                           bytes=len(getattr(http_response, 'content', b'') or b''),
+                           retries=metadata.get('RetryAttempts', 0), error=error)
+    
+    client.meta.events.register('before-call.secretsmanager.*', before_call)
+    client.meta.events.register('after-call.secretsmanager.*', after_call)
+
+# Switch between Secrets Manager and the local SQLite store
+def configure_backend(backend="aws", local_db=LOCAL_DB, workers=IMPORT_WORKERS):
+    global BACKEND, LOCAL_DB, _client, _client_workers
+    with _client_lock:
+        BACKEND = backend
+        LOCAL_DB = local_db
+        _client_workers = workers
+        _client = None
+
+# Read-through cache for retrieve_fingerprints: an in-process LRU, optionally
+# backed by a SQLite file so repeated CLI runs share it. Writes go through
+# store/rotate/delete, which update or drop the cached entry.
+class FingerprintCache:
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = open_private_db(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS fingerprints "
+                             "(domain TEXT PRIMARY KEY, stored_at REAL NOT NULL, data TEXT NOT NULL)")
+    
+    def get(self, domain):
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(domain)
+                self.hits += 1
+                return dict(entry[1])
+            if self._db is not None:
+                row = self._db.execute("SELECT stored_at, data FROM fingerprints WHERE domain = ?",
+                                       (domain,)).fetchone()
+                if row is not None and now - row[0] < self.ttl:
+                    fingerprints = json.loads(row[1])
+                    self._remember(domain, row[0], fingerprints)
+                    self.disk_hits += 1
+                    return dict(fingerprints)
+            self.misses += 1
+            return None
+    
+    def put(self, domain, fingerprints):
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(domain, now, dict(fingerprints))
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("INSERT OR REPLACE INTO fingerprints (domain, stored_at, data) VALUES (?, ?, ?)",
+                                     (domain, now, json.dumps(fingerprints)))
+    
+    # Cache many domains at once, in a single SQLite transaction
+    def put_many(self, items):
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        items = [(domain, dict(fingerprints)) for domain, fingerprints in items]
+        with self._lock:
+            for domain, fingerprints in items:
+                self._remember(domain, now, fingerprints)
+            if self._db is not None:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO fingerprints (domain, stored_at, data) VALUES (?, ?, ?)",
+                                         [(domain, now, json.dumps(fingerprints)) for domain, fingerprints in items])
+    
+    def invalidate(self, domain):
+        with self._lock:
+            self._entries.pop(domain, None)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM fingerprints WHERE domain = ?", (domain,))
+    
+    def _remember(self, domain, stored_at, fingerprints):
+        self._entries[domain] = (stored_at, fingerprints)
+        self._entries.move_to_end(domain)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+fingerprint_cache = FingerprintCache()
+
+# Replace the process-wide cache, e.g. to add the on-disk layer from the command line
+def configure_cache(ttl=CACHE_TTL, path=None, max_entries=CACHE_MAX_ENTRIES):
+    global fingerprint_cache
+    fingerprint_cache = FingerprintCache(ttl, max_entries, path)
+    return fingerprint_cache
+
+# Print a one-line progress update about every 10% and at the end
+def report_progress(label, done, total, started, failed=0):
+    step = max(total // 10, 1)
+    if done == total or done % step == 0:
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        print(f"{label}: {done}/{total} domains ({failed} failed) in {elapsed:.1f}s, {rate:.0f}/s")
 
 # Store certificate fingerprints for a domain
 def store_fingerprints(domain, primary_fingerprint=None, backup_fingerprint=None, rotation_date=None):
@@ -55,40 +408,62 @@ def store_fingerprints(domain, primary_fingerprint=None, backup_fingerprint=None
     if rotation_date is not None:
         current_secret["rotation_date"] = rotation_date
     
+    return write_fingerprints(domain, current_secret)
+
+# Write a complete fingerprint secret, creating it first when exists is False
+def write_fingerprints(domain, secret, exists=True):
+    client = get_secrets_client()
+    secret_name = f"{SECRET_NAME_PREFIX}/{domain}"
+    
     # Store the updated secret
     try:
-        client.put_secret_value(
-            SecretId=secret_name,
-            SecretString=json.dumps(current_secret)
-        )
-        print(f"Successfully stored fingerprints for {domain}")
-    except ClientError as e:
-        # If the secret doesn't exist yet, create it
-        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+        if not exists:
             try:
                 client.create_secret(
                     Name=secret_name,
-                    SecretString=json.dumps(current_secret),
+                    SecretString=json.dumps(secret),
                     Description=f"Certificate fingerprints for {domain}"
                 )
                 print(f"Successfully created and stored fingerprints for {domain}")
+                fingerprint_cache.put(domain, secret)
+                return True
             except ClientError as e:
-                print(f"Error creating secret: {e}")
-                return False
-        else:
+                # Created since our snapshot was taken; update it instead
+                if e.response['Error']['Code'] != 'ResourceExistsException':
+                    raise
+        client.put_secret_value(
+            SecretId=secret_name,
+            SecretString=json.dumps(secret)
+        )
+        print(f"Successfully stored fingerprints for {domain}")
+    except ClientError as e:
+        # If the secret doesn't exist yet, create it
+        if e.response['Error']['Code'] == 'ResourceNotFoundException' and exists:
+            return write_fingerprints(domain, secret, exists=False)
+        fingerprint_cache.invalidate(domain)
+        if exists:
             print(f"Error storing fingerprints: {e}")
-            return False
+        else:
+            print(f"Error creating secret: {e}")
+        return False
     
+    fingerprint_cache.put(domain, secret)
     return True
 
-# Retrieve certificate fingerprints for a domain
-def retrieve_fingerprints(domain):
+# Retrieve certificate fingerprints for a domain, from the cache when it has a fresh copy
+def retrieve_fingerprints(domain, use_cache=True):
+    if use_cache:
+        fingerprints = fingerprint_cache.get(domain)
+        if fingerprints is not None:
+            return fingerprints
+    
     client = get_secrets_client()
     secret_name = f"{SECRET_NAME_PREFIX}/{domain}"
     
     try:
         response = client.get_secret_value(SecretId=secret_name)
         fingerprints = json.loads(response['SecretString'])
+        fingerprint_cache.put(domain, fingerprints)
         return fingerprints
     except ClientError as e:
         if e.response['Error']['Code'] == 'ResourceNotFoundException':
@@ -117,21 +492,102 @@ def list_domains():
         return domains
     except ClientError as e:
         print(f"Error listing domains: {e}")
-        return []
+        return None
+
+# Fetch the fingerprints of every domain with one GetSecretValue call each, in parallel
+def retrieve_each_fingerprints(label, started):
+    fingerprints_data = {}
+    unread = set()
+    domains = list_domains()
+    if domains is None:
+        return None, unread
+    with ThreadPoolExecutor(max_workers=IMPORT_WORKERS) as pool:
+        fetched = pool.map(lambda domain: retrieve_fingerprints(domain, use_cache=False), domains)
+        for domain, fingerprints in zip(domains, fetched):
+            if fingerprints:
+                fingerprints_data[domain] = fingerprints
+            else:
+                unread.add(domain)
+    report_progress(label, len(domains), len(domains), started, len(unread))
+    return fingerprints_data, unread
+
+# Domain a secret name or ARN from a BatchGetSecretValue error refers to, None if it is not ours
+def secret_domain(secret_id):
+    name = secret_id or ''
+    if name.startswith('arn:'):
+        # arn:aws:secretsmanager:REGION:ACCOUNT:secret:NAME-XXXXXX
+        name = name.split(':secret:', 1)[-1].rsplit('-', 1)[0]
+    if name.startswith(SECRET_NAME_PREFIX + '/'):
+        return name[len(SECRET_NAME_PREFIX) + 1:]
+    return None
+
+# Fetch the fingerprints of every domain, up to 20 secrets per BatchGetSecretValue call.
+# Returns (fingerprints by domain, domains that exist but could not be read);
+# the fingerprints are None when not even the list of domains could be read
+def retrieve_all_fingerprints(label="Exported"):
+    client = get_secrets_client()
+    fingerprints_data = {}
+    unread = set()
+    started = time.monotonic()
+    
+    if not hasattr(client, 'batch_get_secret_value'):
+        # botocore older than 1.34.25 has no batch call; fetch the domains in parallel instead
+        return retrieve_each_fingerprints(label, started)
+    
+    try:
+        # BatchGetSecretValue has no paginator, so follow NextToken by hand
+        request = {
+            'Filters': [{'Key': 'name', 'Values': [SECRET_NAME_PREFIX + '/']}],
+            'MaxResults': BATCH_GET_SIZE,
+        }
+        while True:
+            page = client.batch_get_secret_value(**request)
+            for secret in page.get('SecretValues', []):
+                if not secret['Name'].startswith(SECRET_NAME_PREFIX + '/'):
+                    continue
+                domain = secret['Name'][len(SECRET_NAME_PREFIX) + 1:]
+                try:
+                    fingerprints_data[domain] = json.loads(secret['SecretString'])
+                except (KeyError, ValueError):
+                    print(f"Error: Could not parse fingerprints for {domain}")
+                    unread.add(domain)
+            for error in page.get('Errors', []):
+                print(f"Error retrieving {error.get('SecretId')}: {error.get('ErrorCode')} {error.get('Message', '')}")
+                domain = secret_domain(error.get('SecretId'))
+                if domain is None:
+                    # Cannot tell which domain failed, so nothing is known about any of them
+                    return None, unread
+                unread.add(domain)
+            done = len(fingerprints_data) + len(unread)
+            if done and done % 500 < BATCH_GET_SIZE:
+                print(f"{label}: {done} domains so far ({len(unread)} failed) in {time.monotonic() - started:.1f}s")
+            if not page.get('NextToken'):
+                break
+            request['NextToken'] = page['NextToken']
+    except ClientError as e:
+        if e.response['Error']['Code'] in BATCH_GET_DENIED:
+            # Policies that predate the batch call grant only ListSecrets and GetSecretValue
+            print(f"BatchGetSecretValue not permitted ({e.response['Error']['Code']}), "
+                  "fetching each domain instead")
+            return retrieve_each_fingerprints(label, started)
+        print(f"Error retrieving fingerprints: {e}")
+        return None, unread
+    
+    fingerprint_cache.put_many(fingerprints_data.items())
+    done = len(fingerprints_data) + len(unread)
+    report_progress(label, done, done, started, len(unread))
+    return fingerprints_data, unread
 
 # Export all fingerprints to a JSON file
 def export_fingerprints(output_file):
-    domains = list_domains()
-    if not domains:
+    with tracer.phase("fetch all fingerprints"):
+        fingerprints_data, _ = retrieve_all_fingerprints()
+    if fingerprints_data is None:
+        return False
+    if not fingerprints_data:
         print("No domains found with stored fingerprints")
         return False
     
-    fingerprints_data = {}
-    for domain in domains:
-        fingerprints = retrieve_fingerprints(domain)
-        if fingerprints:
-            fingerprints_data[domain] = fingerprints
-    
     try:
         with open(output_file, 'w') as f:
             json.dump(fingerprints_data, f, indent=2)
@@ -141,22 +597,100 @@ def export_fingerprints(output_file):
         print(f"Error exporting fingerprints: {e}")
         return False
 
-# Import fingerprints from a JSON file
-def import_fingerprints(input_file):
+# The fields an import sets, with the defaults it has always used for missing ones
+def import_fields(fingerprints):
+    return {
+        "primary": fingerprints.get("primary", ""),
+        "backup": fingerprints.get("backup", ""),
+        "rotation_date": fingerprints.get("rotation_date", ""),
+    }
+
+# Stable hash of the imported fields, to tell whether a domain needs writing
+def fingerprint_hash(fingerprints):
+    fields = json.dumps(import_fields(fingerprints), sort_keys=True)
+    return hashlib.sha256(fields.encode()).hexdigest()
+
+# Store one imported domain; errors count as a failed domain instead of aborting the import
+def import_domain(domain, fingerprints, current=None, known=False):
+    try:
+        if not known:
+            # No snapshot of the current state; read, merge and write as store does
+            fields = import_fields(fingerprints)
+            return store_fingerprints(domain, fields["primary"], fields["backup"], fields["rotation_date"])
+        secret = dict(current or {})
+        secret.update(import_fields(fingerprints))
+        return write_fingerprints(domain, secret, exists=current is not None)
+    except ClientError as e:
+        print(f"Error storing fingerprints for {domain}: {e}")
+        return False
+
+# Import fingerprints from a JSON file, writing only the domains that differ from what is stored
+def import_fingerprints(input_file, workers=IMPORT_WORKERS):
     try:
         with open(input_file, 'r') as f:
             fingerprints_data = json.load(f)
         
-        success_count = 0
+        # One bulk read of the current state. Domains it could not read (all of
+        # them when current_data is None) are written with a read-merge-write,
+        # as before, so keys outside the imported fields are kept
+        with tracer.phase("fetch current state"):
+            current_data, unread = retrieve_all_fingerprints(label="Fetched current state")
+        state_known = current_data is not None
+        current_data = current_data or {}
+        known = {}
+        
+        created, updated, unchanged, written = [], [], [], []
         for domain, fingerprints in fingerprints_data.items():
-            primary = fingerprints.get("primary", "")
-            backup = fingerprints.get("backup", "")
-            rotation_date = fingerprints.get("rotation_date", "")
-            
-            if store_fingerprints(domain, primary, backup, rotation_date):
-                success_count += 1
+            current = current_data.get(domain)
+            known[domain] = state_known and domain not in unread
+            if not known[domain]:
+                written.append(domain)
+            elif current is None:
+                created.append(domain)
+            elif fingerprint_hash(current) == fingerprint_hash(fingerprints):
+                unchanged.append(domain)
+            else:
+                updated.append(domain)
+        pending = created + updated + written
         
-        print(f"Successfully imported fingerprints for {success_count} domains")
+        started = time.monotonic()
+        total = len(pending)
+        failed = set()
+        done = 0
+        client = get_secrets_client()
+        with tracer.phase("write changed domains", domains=total):
+            if hasattr(client, 'transaction'):
+                # Local backend: one transaction for the whole import, no thread pool
+                with client.transaction():
+                    for domain in pending:
+                        done += 1
+                        if not import_domain(domain, fingerprints_data[domain], current_data.get(domain),
+                                             known[domain]):
+                            failed.add(domain)
+                        report_progress("Imported", done, total, started, len(failed))
+            else:
+                with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+                    futures = {pool.submit(import_domain, domain, fingerprints_data[domain],
+                                           current_data.get(domain), known[domain]): domain
+                               for domain in pending}
+                    for future in as_completed(futures):
+                        done += 1
+                        if not future.result():
+                            failed.add(futures[future])
+                        report_progress("Imported", done, total, started, len(failed))
+        
+        created_count = sum(1 for domain in created if domain not in failed)
+        updated_count = sum(1 for domain in updated if domain not in failed)
+        written_count = sum(1 for domain in written if domain not in failed)
+        if not state_known:
+            print(f"Successfully imported fingerprints for {written_count} domains: "
+                  f"{written_count} written (state unknown), {len(failed)} failed")
+            return True
+        imported = created_count + updated_count + written_count + len(unchanged)
+        counts = f"{created_count} created, {updated_count} updated, {len(unchanged)} unchanged"
+        if written:
+            counts += f", {written_count} written (state unknown)"
+        print(f"Successfully imported fingerprints for {imported} domains: {counts}, {len(failed)} failed")
         return True
     except Exception as e:
         print(f"Error importing fingerprints: {e}")
@@ -164,8 +698,8 @@ def import_fingerprints(input_file):
 
 # Rotate certificate fingerprints for a domain
 def rotate_fingerprints(domain, new_primary_fingerprint, new_rotation_date=None):
-    # Get current fingerprints
-    current_fingerprints = retrieve_fingerprints(domain)
+    # Get current fingerprints, bypassing the cache so the old primary is not stale
+    current_fingerprints = retrieve_fingerprints(domain, use_cache=False)
     if not current_fingerprints:
         print(f"No existing fingerprints found for {domain}. Creating new entry.")
         current_fingerprints = {
@@ -199,9 +733,11 @@ def delete_fingerprints(domain):
             SecretId=secret_name,
             RecoveryWindowInDays=7  # Allows recovery within 7 days
         )
+        fingerprint_cache.invalidate(domain)
         print(f"Successfully scheduled deletion of fingerprints for {domain} (recoverable for 7 days)")
         return True
     except ClientError as e:
+        fingerprint_cache.invalidate(domain)
         if e.response['Error']['Code'] == 'ResourceNotFoundException':
             print(f"No fingerprints found for {domain}")
             return False
@@ -212,6 +748,18 @@ def delete_fingerprints(domain):
 # Parse command line arguments
 def parse_args():
     parser = argparse.ArgumentParser(description="AWS Secrets Manager integration for certificate fingerprints")
+    parser.add_argument("--backend", choices=["aws", "local"], default=BACKEND,
+                        help=f"Where fingerprints are stored (default: {BACKEND})")
+    parser.add_argument("--local-db", default=LOCAL_DB,
+                        help=f"SQLite file used by --backend local (default: {LOCAL_DB})")
+    parser.add_argument("--cache-ttl", type=int, default=CACHE_TTL,
+                        help=f"Seconds retrieved fingerprints are reused, 0 to disable (default: {CACHE_TTL})")
+    parser.add_argument("--cache-file",
+                        help="SQLite file that shares the fingerprint cache between runs. Only runs given the "
+                             "same file drop entries on store/rotate/delete; changes made without it stay "
+                             "stale here until --cache-ttl expires")
+    parser.add_argument("--cache-stats", action="store_true", help="Print cache hit/miss counters on exit")
+    ops_instrumentation.add_arguments(parser)
     subparsers = parser.add_subparsers(dest="command", help="Command to execute")
     
     # Store command
@@ -235,6 +783,8 @@ def parse_args():
     # Import command
     import_parser = subparsers.add_parser("import", help="Import fingerprints from a JSON file")
     import_parser.add_argument("input_file", help="Input file path")
+    import_parser.add_argument("--workers", type=int, default=IMPORT_WORKERS,
+                               help=f"Domains imported in parallel (default: {IMPORT_WORKERS})")
     
     # Rotate command
     rotate_parser = subparsers.add_parser("rotate", help="Rotate certificate fingerprints")
@@ -251,7 +801,19 @@ def parse_args():
 # Main function
 def main():
     args = parse_args()
+    ops_instrumentation.start_from_args(args, "aws_secrets_manager")
+    configure_backend(args.backend, args.local_db, getattr(args, "workers", IMPORT_WORKERS))
+    configure_cache(args.cache_ttl, args.cache_file)
+    with tracer.phase(args.command or "help"):
+        status = run_command(args)
     
+    if args.cache_stats:
+        print(f"Fingerprint cache: {json.dumps(fingerprint_cache.stats())}")
+    tracer.finish()
+    return status
+
+# Run the selected command
+def run_command(args):
     if args.command == "store":
         store_fingerprints(args.domain, args.primary, args.backup, args.rotation_date)
     elif args.command == "retrieve":
@@ -260,7 +822,9 @@ def main():
             print(json.dumps(fingerprints, indent=2))
     elif args.command == "list":
         domains = list_domains()
-        if domains:
+        if domains is None:
+            pass
+        elif domains:
             print("Domains with stored fingerprints:")
             for domain in domains:
                 print(f"  {domain}")
@@ -269,7 +833,7 @@ def main():
     elif args.command == "export":
         export_fingerprints(args.output_file)
     elif args.command == "import":
-        import_fingerprints(args.input_file)
+        import_fingerprints(args.input_file, args.workers)
     elif args.command == "rotate":
         rotate_fingerprints(args.domain, args.new_fingerprint, args.rotation_date)
     elif args.command == "delete":
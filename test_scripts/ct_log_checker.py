@@ -8,25 +8,51 @@ before deployment.
 
 Usage:
   python ct_log_checker.py --domains domain1.com,domain2.com [--min-logs 2] [--verbose]
+                           [--concurrency 8] [--rate-limit 2] [--retries 3]
+                           [--cache-db ct_cache.sqlite] [--cache-ttl 21600] [--offline]
+                           [--sources crt.sh,google] [--crt-sh-url URL] [--google-url URL]
+                           [--trace trace.json [--profile sample]]
+
+  Point --crt-sh-url/--google-url at ct_standin_server.py to run without network access.
 
 Requirements:
-  - Python 3.6+
+  - Python 3.7+
   - requests library (pip install requests)
 """
 
 import argparse
+import codecs
 import json
+import os
+import queue
+import random
+import sqlite3
 import sys
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 import requests
 
+import ops_instrumentation
+from ops_instrumentation import tracer
+
 # Certificate Transparency Log API endpoints
 CT_APIS = {
     "crt.sh": "https://crt.sh/?q={domain}&output=json",
     "google": "https://transparencyreport.google.com/transparencyreport/api/v3/httpsreport/ct/certsearch?include_subdomains=true&domain={domain}"
 }
 
+# Anti-XSSI prefix Google puts in front of its JSON responses
+XSSI_PREFIX = ")]}'\n"
+
+# Bytes read from a streamed crt.sh response at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+# Characters that can continue a JSON number
+NUMBER_CHARS = frozenset("0123456789.eE+-")
+
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description="Check Certificate Transparency logs for domains")
@@ -37,39 +63,398 @@ def parse_arguments():
                         help="Maximum age in days for certificates to check (default: 30)")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
     parser.add_argument("--output-json", help="Path to output JSON report")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Domains checked in parallel (default: 8)")
+    parser.add_argument("--rate-limit", type=float, default=2.0,
+                        help="Maximum requests per second to each CT API host, 0 for no limit (default: 2)")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Retries with exponential backoff on 429/5xx and connection errors (default: 3)")
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="Per-request timeout in seconds (default: 10)")
+    parser.add_argument("--cache-db", help="SQLite file caching crt.sh results between runs")
+    parser.add_argument("--cache-ttl", type=int, default=6 * 3600,
+                        help="Seconds a cached crt.sh result is used without refreshing (default: 21600)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Answer only from --cache-db, ignoring the TTL, without any network access")
+    parser.add_argument("--sources", default="crt.sh",
+                        help=f"Comma-separated CT sources queried concurrently, from: {', '.join(CT_APIS)} "
+                             "(default: crt.sh)")
+    parser.add_argument("--crt-sh-url", default=CT_APIS["crt.sh"],
+                        help="crt.sh query URL with a {domain} placeholder")
+    parser.add_argument("--google-url", default=CT_APIS["google"],
+                        help="Google CT search URL with a {domain} placeholder")
+    ops_instrumentation.add_arguments(parser)
     return parser.parse_args()
 
-def check_crt_sh(domain, verbose=False):
-    """Check certificates for a domain using crt.sh API"""
-    url = CT_APIS["crt.sh"].format(domain=domain)
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
+class CTCache:
+    """On-disk cache of crt.sh results keyed by domain.
+
+    Every certificate entry is stored once under its crt.sh ID. A refresh sends
+    the validators from the previous response (If-None-Match/If-Modified-Since)
+    and inserts only the IDs that have not been seen before, so a domain whose
+    history did not change costs one small request and no writes.
+    """
+
+    def __init__(self, path, ttl=6 * 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS domains (
+                domain TEXT PRIMARY KEY,
+                fetched_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            );
+            CREATE TABLE IF NOT EXISTS certs (
+                domain TEXT NOT NULL,
+                cert_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (domain, cert_id)
+            );
+        """)
+
+    @staticmethod
+    def cert_key(cert):
+        if cert.get("id") is not None:
+            return str(cert["id"])
+        return f'{cert.get("serial_number", "")}/{cert.get("not_before", "")}'
+
+    def lookup(self, domain):
+        """Return (fetched_at, etag, last_modified) for a cached domain, or None"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT fetched_at, etag, last_modified FROM domains WHERE domain = ?",
+                (domain,)).fetchone()
+
+    def is_fresh(self, state):
+        return state is not None and time.time() - state[0] < self.ttl
+
+    def certs(self, domain, batch_size=1000):
+        """Yield the cached entries for a domain, reading them in batches"""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT rowid, data FROM certs WHERE domain = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                    (domain, last_rowid, batch_size)).fetchall()
+            for _, data in rows:
+                yield json.loads(data)
+            if len(rows) < batch_size:
+                return
+            last_rowid = rows[-1][0]
+
+    def touch(self, domain):
+        """Record that the cached result was revalidated just now"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE domains SET fetched_at = ? WHERE domain = ?", (time.time(), domain))
+
+    def store(self, domain, certs, etag=None, last_modified=None, batch_size=1000, stats=None):
+        """Pass certs through, inserting the entries not seen before in batches.
+
+        The domain only counts as fetched once certs is exhausted, so a stream
+        that breaks off midway is refreshed again on the next run. The number
+        of new entries is left in stats["added"] when a dict is given.
+        """
+        with self._lock:
+            known = {cert_id for (cert_id,) in self._db.execute(
+                "SELECT cert_id FROM certs WHERE domain = ?", (domain,))}
+        added = 0
+        pending = []
+        for cert in certs:
+            key = self.cert_key(cert)
+            if key not in known:
+                known.add(key)
+                pending.append((domain, key, json.dumps(cert, separators=(",", ":"))))
+                if len(pending) >= batch_size:
+                    added += self._insert(pending)
+                    pending = []
+            yield cert
+        added += self._insert(pending)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO domains (domain, fetched_at, etag, last_modified) VALUES (?, ?, ?, ?)",
+                (domain, time.time(), etag, last_modified))
+        if stats is not None:
+            stats["added"] = added
+
+    def _insert(self, rows):
+        if rows:
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR IGNORE INTO certs (domain, cert_id, data) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class HostRateLimiter:
+    """Spaces out requests to each host so they stay under a requests-per-second budget.
+
+    Threads reserve the next free slot for a host under a lock and then sleep
+    outside it, so a busy host never blocks requests to another one.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def defer(self, host, seconds):
+        """Push back every later request to host, e.g. after a Retry-After"""
+        with self._lock:
+            resume = time.monotonic() + seconds
+            self._next_slot[host] = max(self._next_slot.get(host, 0), resume)
+
+class CTClient:
+    """Shared keep-alive HTTP session for the CT APIs with rate limiting and retries"""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, concurrency=8, rate_limit=2.0, retries=3, timeout=10, backoff=1.0):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(concurrency, 1))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiter = HostRateLimiter(rate_limit)
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+
+    def get(self, url, **kwargs):
+        """GET url, retrying 429/5xx responses and connection errors with backoff.
+
+        Returns the last response; raises the last RequestException if every
+        attempt failed to connect. A streamed response carries its StreamedCall
+        as response.trace_call for the caller to finish once the body is read.
+        """
+        host = urlparse(url).netloc
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(host)
+            if attempt:
+                tracer.count(f"retries {host}")
+            call = StreamedCall(f"GET {host}", url=url, retries=min(attempt, 1))
             try:
-                certs = response.json()
-                if verbose:
-                    print(f"Found {len(certs)} certificates for {domain} in crt.sh")
-                return certs
+                response = self.session.get(url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                call.finish(error=type(e).__name__)
+                if attempt == self.retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            call.args["status"] = response.status_code
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                if kwargs.get("stream"):
+                    # The caller reads the body, so it ends the call
+                    response.trace_call = call
+                else:
+                    call.add_bytes(len(response.content))
+                    call.finish()
+                return response
+            call.finish()
+            delay = self._retry_after(response) or self._backoff(attempt)
+            if response.status_code == 429:
+                self.limiter.defer(host, delay)
+            response.close()
+            time.sleep(delay)
+        return response
+
+    def _backoff(self, attempt):
+        # Exponential backoff with jitter so parallel workers do not retry in lockstep
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+
+    def close(self):
+        self.session.close()
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array read from an iterable of byte chunks.
+
+    Only the current element is held in memory, so arbitrarily large responses
+    are parsed in constant space. Raises json.JSONDecodeError on malformed input.
+    """
+    decoder = json.JSONDecoder()
+    # Incremental, so a UTF-8 sequence split between two chunks decodes correctly
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+        while True:
+            # Skip whitespace and the separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise json.JSONDecodeError("Expected a JSON array", buffer, pos)
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
             except json.JSONDecodeError:
-                print(f"Error: Could not parse JSON response from crt.sh for {domain}")
-                return []
+                # Element split across chunks; wait for more data
+                break
+            if not isinstance(item, (dict, list)) and all(c in NUMBER_CHARS for c in buffer[end:]):
+                # A number or literal at the end of the buffer may continue in the
+                # next chunk ("12." + "5", "1e" + "3", "1" + "2")
+                break
+            yield item
+            pos = end
+    # Out of input: report what is wrong with the rest, if it is more than truncated
+    while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+        pos += 1
+    if started and pos < len(buffer):
+        decoder.raw_decode(buffer, pos)
+    raise json.JSONDecodeError("Unterminated JSON array", buffer, len(buffer))
+
+class StreamedCall:
+    """A remote call in the trace that ends when finish() is called, not when the headers arrive"""
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def add_bytes(self, count):
+        self.args["bytes"] = self.args.get("bytes", 0) + count
+
+    def finish(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        if error:
+            self.args["error"] = error
+        tracer.record_call(self.name, self.started, time.perf_counter() - self.started, **self.args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # GeneratorExit only means the consumer stopped reading early
+        self.finish(error=exc_type.__name__ if exc_type and exc_type is not GeneratorExit else None)
+
+def traced_chunks(chunks, call):
+    """Pass chunks through, adding their size to call's byte count"""
+    for chunk in chunks:
+        call.add_bytes(len(chunk))
+        yield chunk
+
+def check_crt_sh(domain, verbose=False, client=None, cache=None, offline=False, url=None):
+    """Yield certificates for a domain from the crt.sh API, through the cache if one is given.
+
+    The response is parsed as it streams in, so callers that drop records as
+    they go keep memory flat however many certificates crt.sh returns.
+    """
+    state = cache.lookup(domain) if cache else None
+    if state is not None and (offline or cache.is_fresh(state)):
+        if verbose:
+            print(f"Using cached certificates for {domain}")
+        yield from cache.certs(domain)
+        return
+    if offline:
+        print(f"Error: No cached crt.sh result for {domain} (offline mode)")
+        return
+
+    url = (url or CT_APIS["crt.sh"]).format(domain=domain)
+    headers = {}
+    if state is not None:
+        if state[1]:
+            headers["If-None-Match"] = state[1]
+        if state[2]:
+            headers["If-Modified-Since"] = state[2]
+    try:
+        if client:
+            response = client.get(url, headers=headers, stream=True)
+            call = response.trace_call
         else:
-            print(f"Error: crt.sh API returned status code {response.status_code} for {domain}")
-            return []
+            call = StreamedCall(f"GET {urlparse(url).netloc}", url=url)
+            response = requests.get(url, headers=headers, timeout=10, stream=True)
+            call.args["status"] = response.status_code
     except requests.exceptions.RequestException as e:
+        if not client:
+            call.finish(error=type(e).__name__)
         print(f"Error: Failed to connect to crt.sh API: {e}")
-        return []
+        return
+    # The call ends once the body has been read, or when the caller stops iterating
+    with response, call:
+        if response.status_code == 304 and state is not None:
+            call.finish()
+            cache.touch(domain)
+            if verbose:
+                print(f"crt.sh result for {domain} unchanged, using cache")
+            yield from cache.certs(domain)
+            return
+        if response.status_code != 200:
+            print(f"Error: crt.sh API returned status code {response.status_code} for {domain}")
+            return
+        count = 0
+        stats = {}
+        certs = iter_json_array(traced_chunks(response.iter_content(STREAM_CHUNK_SIZE), call))
+        if cache:
+            certs = cache.store(domain, certs, response.headers.get("ETag"),
+                                response.headers.get("Last-Modified"), stats=stats)
+        try:
+            for cert in certs:
+                count += 1
+                yield cert
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            call.finish(error=type(e).__name__)
+            print(f"Error: Could not parse JSON response from crt.sh for {domain}")
+            return
+        except requests.exceptions.RequestException as e:
+            call.finish(error=type(e).__name__)
+            print(f"Error: crt.sh response for {domain} was cut off: {e}")
+            return
+        call.finish()
+        if verbose:
+            print(f"Found {count} certificates for {domain} in crt.sh")
+            if cache:
+                print(f"Cached {stats['added']} new certificates for {domain}")
 
-def check_google_ct(domain, verbose=False):
+def check_google_ct(domain, verbose=False, client=None, url=None):
     """Check certificates for a domain using Google's CT API"""
-    url = CT_APIS["google"].format(domain=domain)
+    url = (url or CT_APIS["google"]).format(domain=domain)
     try:
-        response = requests.get(url, timeout=10)
+        response = client.get(url) if client else requests.get(url, timeout=10)
         if response.status_code == 200:
             # Google's API returns a weird format that needs preprocessing
             text = response.text
-            if text.startswith(")"]}'\n"):
-                text = text.split(")"]}'\n")[1]
+            if text.startswith(XSSI_PREFIX):
+                text = text[len(XSSI_PREFIX):]
                 try:
                     # This is still not proper JSON, but we can extract what we need
                     data = json.loads(text)
@@ -89,9 +474,212 @@ def check_google_ct(domain, verbose=False):
         print(f"Error: Failed to connect to Google CT API: {e}")
         return []
 
+def google_records(data):
+    """Yield crt.sh-shaped records for the certificate rows of a Google CT search response.
+
+    Rows look like [_, subject, issuer, not_before_ms, not_after_ms, hash, ...];
+    rows that do not match are skipped.
+    """
+    try:
+        rows = data[0][1]
+    except (IndexError, KeyError, TypeError):
+        return
+    for row in rows or []:
+        try:
+            not_before = datetime.fromtimestamp(row[3] / 1000, timezone.utc)
+            not_after = datetime.fromtimestamp(row[4] / 1000, timezone.utc)
+        except (IndexError, TypeError, ValueError, OverflowError):
+            continue
+        yield {
+            "id": row[5] if len(row) > 5 else None,
+            "common_name": row[1],
+            "issuer_name": row[2],
+            "not_before": not_before.strftime("%Y-%m-%dT%H:%M:%S"),
+            "not_after": not_after.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+class CTSource:
+    """A CT search backend; fetch() yields crt.sh-shaped certificate records"""
+    name = None
+
+    def __init__(self, url):
+        self.url = url
+
+    def fetch(self, domain, client, verbose=False):
+        raise NotImplementedError
+
+class CrtShSource(CTSource):
+    name = "crt.sh"
+
+    def __init__(self, url, cache=None, offline=False):
+        super().__init__(url)
+        self.cache = cache
+        self.offline = offline
+
+    def fetch(self, domain, client, verbose=False):
+        for cert in check_crt_sh(domain, verbose, client, self.cache, self.offline, self.url):
+            cert["source"] = self.name
+            yield cert
+
+class GoogleCTSource(CTSource):
+    name = "google"
+
+    def fetch(self, domain, client, verbose=False):
+        for cert in google_records(check_google_ct(domain, verbose, client, self.url)):
+            cert["source"] = self.name
+            yield cert
+
+def fetch_all(domain, sources, client, verbose=False, batch_size=256, put_timeout=0.1):
+    """Yield the records of every source for a domain, querying the sources concurrently.
+
+    Records arrive in batches through a bounded queue, so a fast source cannot
+    run far ahead of the analysis and memory stays flat. A source that fails
+    is reported and skipped, however many sources there are. When the caller
+    stops iterating, the pump threads notice within put_timeout, stop reading
+    and close their responses.
+    """
+    if len(sources) == 1:
+        source = sources[0]
+        try:
+            yield from source.fetch(domain, client, verbose)
+        except Exception as e:
+            print(f"Error: {source.name} query for {domain} failed: {e}")
+        return
+    records = queue.Queue(maxsize=16)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        """Queue item for the consumer; False once the consumer has gone away"""
+        while not stop.is_set():
+            try:
+                records.put(item, timeout=put_timeout)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def pump(source):
+        certs = source.fetch(domain, client, verbose)
+        batch = []
+        try:
+            for cert in certs:
+                batch.append(cert)
+                if len(batch) >= batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+        except Exception as e:
+            if not stop.is_set():
+                print(f"Error: {source.name} query for {domain} failed: {e}")
+        finally:
+            certs.close()
+            # Records read before a failure are kept, as with a single source
+            if batch:
+                put(batch)
+            put(done)
+
+    for source in sources:
+        threading.Thread(target=pump, args=(source,), daemon=True).start()
+    remaining = len(sources)
+    try:
+        while remaining:
+            batch = records.get()
+            if batch is done:
+                remaining -= 1
+            else:
+                yield from batch
+    finally:
+        stop.set()
+
+class CertRecord:
+    """The fields of one CT log entry that the analysis needs"""
+    __slots__ = ("key", "issuer", "not_before", "not_after", "ct_log")
+
+    def __init__(self, key, issuer, not_before, not_after, ct_log):
+        self.key = key
+        self.issuer = issuer
+        self.not_before = not_before
+        self.not_after = not_after
+        self.ct_log = ct_log
+
+    @staticmethod
+    def dedup_key(cert):
+        """Same certificate seen twice (e.g. in several logs or crt.sh rows) gets the same key"""
+        serial = cert.get("serial_number")
+        if serial:
+            return (cert.get("issuer_name"), serial)
+        if cert.get("id") is not None:
+            return cert.get("id")
+        # Neither serial nor ID: only a row with the same contents is the same certificate
+        return (cert.get("source"), cert.get("issuer_name"), cert.get("not_before"), cert.get("not_after"),
+                cert.get("name_value") or cert.get("common_name"))
+
+def parse_ct_timestamp(value):
+    """Parse a crt.sh ISO 8601 timestamp into an aware UTC datetime"""
+    if value.endswith("Z"):
+        value = value[:-1]
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
 def analyze_certificates(domain, certs, max_age_days=30, verbose=False):
-    """Analyze certificates for a domain"""
-    if not certs:
+    """Analyze certificates for a domain
+
+    certs may be any iterable, including the generator from fetch_all; only
+    the certificates inside the max_age_days window are kept, as CertRecords
+    deduplicated by issuer and serial number. Sources do not share a common
+    certificate ID, so a certificate another source already reported with the
+    same issuer and validity period is counted once.
+    """
+    # crt.sh reports UTC; a certificate is recent when it is currently valid and
+    # was issued less than max_age_days + 1 whole days ago
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    oldest = now - timedelta(days=max_age_days + 1)
+    # Canonical crt.sh timestamps sort as strings, so most certificates outside
+    # the window are rejected without being parsed
+    now_text, oldest_text = (t.strftime("%Y-%m-%dT%H:%M:%S") for t in (now, oldest))
+    recent = {}
+    validity_sources = {}
+    ct_logs = set()
+    newest = None
+    total = 0
+    
+    for cert in certs:
+        total += 1
+        # crt.sh format
+        if "not_after" not in cert:
+            continue
+        try:
+            not_before = cert["not_before"]
+            if len(not_before) == 19 and not oldest_text < not_before <= now_text:
+                continue
+            not_before = parse_ct_timestamp(not_before)
+            if not oldest < not_before <= now:
+                continue
+            not_after = parse_ct_timestamp(cert["not_after"])
+            if now > not_after:
+                continue
+        except (ValueError, KeyError, TypeError, AttributeError):
+            continue
+        ct_log = cert.get("ct_log")
+        if ct_log:
+            ct_logs.add(ct_log)
+        key = CertRecord.dedup_key(cert)
+        if key in recent:
+            continue
+        issuer = cert.get("issuer_name", "Unknown")
+        source = cert.get("source")
+        if validity_sources.setdefault((issuer, not_before, not_after), source) != source:
+            continue
+        record = CertRecord(key, issuer, not_before, not_after, ct_log)
+        recent[key] = record
+        # Track newest certificate
+        if newest is None or not_before > newest.not_before:
+            newest = record
+    
+    if not total:
         return {
             "domain": domain,
             "valid_certs": 0,
@@ -102,33 +690,7 @@ def analyze_certificates(domain, certs, max_age_days=30, verbose=False):
             "message": "No certificates found"
         }
     
-    # Filter for recent certificates
-    recent_certs = []
-    newest_cert = None
-    newest_date = None
-    
-    for cert in certs:
-        # crt.sh format
-        if "not_after" in cert:
-            try:
-                not_after = datetime.strptime(cert["not_after"], "%Y-%m-%dT%H:%M:%S")
-                not_before = datetime.strptime(cert["not_before"], "%Y-%m-%dT%H:%M:%S")
-                now = datetime.now()
-                
-                # Check if certificate is valid and recent
-                if not_before <= now <= not_after:
-                    age_days = (now - not_before).days
-                    if age_days <= max_age_days:
-                        recent_certs.append(cert)
-                        
-                        # Track newest certificate
-                        if newest_date is None or not_before > newest_date:
-                            newest_cert = cert
-                            newest_date = not_before
-            except (ValueError, KeyError):
-                continue
-    
-    if not recent_certs:
+    if not recent:
         return {
             "domain": domain,
             "valid_certs": 0,
@@ -140,12 +702,13 @@ def analyze_certificates(domain, certs, max_age_days=30, verbose=False):
         }
     
     # Get information about the newest certificate
-    issuer = newest_cert.get("issuer_name", "Unknown")
-    ct_logs_count = len(set([cert.get("ct_log", "") for cert in recent_certs if cert.get("ct_log")]))
+    issuer = newest.issuer
+    newest_date = newest.not_before
+    ct_logs_count = len(ct_logs)
     
     if verbose:
         print(f"Domain: {domain}")
-        print(f"  Valid certificates: {len(recent_certs)}")
+        print(f"  Valid certificates: {len(recent)}")
         print(f"  CT logs: {ct_logs_count}")
         print(f"  Newest certificate date: {newest_date}")
         print(f"  Issuer: {issuer}")
@@ -155,7 +718,7 @@ def analyze_certificates(domain, certs, max_age_days=30, verbose=False):
     
     return {
         "domain": domain,
-        "valid_certs": len(recent_certs),
+        "valid_certs": len(recent),
         "ct_logs": ct_logs_count,
         "newest_cert_date": newest_date.strftime("%Y-%m-%d") if newest_date else None,
         "issuer": issuer,
@@ -170,11 +733,45 @@ def main():
     exit_code = 0
     
     print(f"Checking {len(domains)} domains for Certificate Transparency logs...")
-    
-    for domain in domains:
+
+    source_names = [s.strip() for s in args.sources.split(",") if s.strip()]
+    unknown = [name for name in source_names if name not in CT_APIS]
+    if unknown or not source_names:
+        print(f"Error: unknown CT sources: {', '.join(unknown) or '(none given)'}")
+        sys.exit(2)
+    if args.offline and not args.cache_db:
+        print("Error: --offline needs --cache-db")
+        sys.exit(2)
+    if args.offline and source_names != ["crt.sh"]:
+        print("Note: only crt.sh results are cached, other sources are skipped in offline mode")
+        source_names = ["crt.sh"]
+    ops_instrumentation.start_from_args(args, "ct_log_checker")
+    cache = None
+    if args.cache_db:
+        cache = CTCache(os.path.expanduser(args.cache_db), args.cache_ttl)
+    client = CTClient(args.concurrency, args.rate_limit, args.retries, args.timeout)
+    sources = []
+    for name in source_names:
+        if name == "crt.sh":
+            sources.append(CrtShSource(args.crt_sh_url, cache, args.offline))
+        else:
+            sources.append(GoogleCTSource(args.google_url))
+
+    def check_domain(domain):
+        with tracer.phase("check domain", domain=domain):
+            certs = fetch_all(domain, sources, client, args.verbose)
+            return analyze_certificates(domain, certs, args.max_age_days, args.verbose)
+
+    # map() yields in input order, so the report matches the --domains order
+    with tracer.phase("check all domains", domains=len(domains)):
+        with ThreadPoolExecutor(max_workers=max(args.concurrency, 1)) as pool:
+            checked = list(pool.map(check_domain, domains))
+    client.close()
+    if cache:
+        cache.close()
+
+    for domain, result in zip(domains, checked):
         print(f"\nChecking {domain}...")
-        certs = check_crt_sh(domain, args.verbose)
-        result = analyze_certificates(domain, certs, args.max_age_days, args.verbose)
         results.append(result)
         
         if result["status"] == "ERROR":
@@ -205,6 +802,7 @@ def main():
         except IOError as e:
             print(f"Error writing JSON report: {e}")
     
+    tracer.finish()
     sys.exit(exit_code)
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Stand-in Certificate Transparency Server
+
+Serves crt.sh-style and Google-style CT search responses from synthetic or
+recorded fixtures so ct_log_checker.py can be run, tested and benchmarked
+without network access. Response size and latency are configurable, and
+crt.sh responses are streamed in chunks so multi-MB fixtures do not have to
+fit in memory on either side.
+
+Usage:
+  python ct_standin_server.py [--port 8480] [--certs 5000] [--latency-ms 200]
+                              [--fixture recorded.json] [--recent-percent 10]
+
+  python ct_log_checker.py --domains example.com --sources crt.sh,google \\
+      --crt-sh-url "http://127.0.0.1:8480/?q={domain}&output=json" \\
+      --google-url "http://127.0.0.1:8480/google?domain={domain}"
+
+Requirements:
+  - Python 3.7+
+  - requests library (imported by ct_log_checker.py)
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from ct_log_checker import XSSI_PREFIX
+
+CT_LOG_NAMES = ["Google 'Argon'", "Google 'Xenon'", "Cloudflare 'Nimbus'",
+                "DigiCert 'Yeti'", "Let's Encrypt 'Oak'", "Sectigo 'Sabre'"]
+
+ISSUERS = ["C=US, O=Let's Encrypt, CN=R3", "C=US, O=Google Trust Services LLC, CN=GTS CA 1D4",
+           "C=US, O=DigiCert Inc, CN=DigiCert TLS RSA SHA256 2020 CA1"]
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Serve synthetic or recorded CT search results")
+    parser.add_argument("--port", type=int, default=8480, help="Port to listen on (default: 8480)")
+    parser.add_argument("--bind", default="127.0.0.1", help="Address to bind to (default: 127.0.0.1)")
+    parser.add_argument("--certs", type=int, default=5000,
+                        help="Synthetic certificates per domain (default: 5000)")
+    parser.add_argument("--recent-percent", type=float, default=10,
+                        help="Share of synthetic certificates issued in the last 30 days (default: 10)")
+    parser.add_argument("--logs", type=int, default=3,
+                        help=f"Distinct CT logs the certificates are spread over, up to {len(CT_LOG_NAMES)} (default: 3)")
+    parser.add_argument("--fixture", help="Recorded crt.sh JSON served for every domain instead of synthetic data")
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="Delay before each response starts, in milliseconds (default: 0)")
+    parser.add_argument("--jitter-ms", type=float, default=0,
+                        help="Random extra delay added to --latency-ms (default: 0)")
+    parser.add_argument("--error-percent", type=float, default=0,
+                        help="Share of requests answered with 503 to exercise retries (default: 0)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic fixtures (default: 1)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+def synthetic_certs(domain, args):
+    """Yield a deterministic crt.sh-shaped history for domain, newest first"""
+    rng = random.Random(zlib.crc32(domain.encode()) ^ args.seed)
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    logs = CT_LOG_NAMES[:max(1, min(args.logs, len(CT_LOG_NAMES)))]
+    recent = int(args.certs * args.recent_percent / 100)
+    base_id = rng.randrange(10 ** 9, 9 * 10 ** 9)
+    for i in range(args.certs):
+        if i < recent:
+            age = timedelta(days=rng.randrange(30), seconds=rng.randrange(86400))
+        else:
+            age = timedelta(days=30 + rng.randrange(3000), seconds=rng.randrange(86400))
+        not_before = today - age
+        yield {
+            "issuer_ca_id": 1000 + i % len(ISSUERS),
+            "issuer_name": ISSUERS[i % len(ISSUERS)],
+            "common_name": domain,
+            "name_value": f"{domain}\nwww.{domain}",
+            "id": base_id + i,
+            "entry_timestamp": (not_before + timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3],
+            "not_before": not_before.strftime("%Y-%m-%dT%H:%M:%S"),
+            "not_after": (not_before + timedelta(days=90)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "serial_number": f"{rng.getrandbits(128):032x}",
+            "ct_log": logs[i % len(logs)],
+        }
+
+def google_rows(certs):
+    """Convert crt.sh-shaped records to rows of Google's certsearch format"""
+    epoch = datetime(1970, 1, 1)
+    for cert in certs:
+        not_before = datetime.strptime(cert["not_before"], "%Y-%m-%dT%H:%M:%S")
+        not_after = datetime.strptime(cert["not_after"], "%Y-%m-%dT%H:%M:%S")
+        yield [None, cert["common_name"], cert["issuer_name"],
+               int((not_before - epoch).total_seconds() * 1000),
+               int((not_after - epoch).total_seconds() * 1000),
+               f"{zlib.crc32(cert['serial_number'].encode()):08x}", 1, None, 1]
+
+class CTStandInHandler(BaseHTTPRequestHandler):
+    """Answers crt.sh queries on / and Google certsearch queries on /google"""
+    protocol_version = "HTTP/1.1"
+    server_version = "CTStandIn/1.0"
+    args = None
+    fixture = None
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            # Clients drop idle keep-alive connections when they exit
+            pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        args = self.args
+        if args.error_percent and random.random() * 100 < args.error_percent:
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        delay = args.latency_ms + random.random() * args.jitter_ms
+        if delay:
+            time.sleep(delay / 1000)
+
+        if url.path.endswith("/certsearch") or url.path == "/google":
+            domain = query.get("domain", [""])[0]
+            self.send_google(domain)
+        elif url.path == "/" and "q" in query:
+            self.send_crt_sh(query["q"][0])
+        else:
+            self.send_error(404)
+
+    def certs_for(self, domain):
+        if self.fixture is not None:
+            return iter(self.fixture)
+        return synthetic_certs(domain, self.args)
+
+    def validator(self, domain):
+        """ETag that changes with the domain, the fixture settings and the day"""
+        key = f"{domain}|{self.args.certs}|{self.args.recent_percent}|{self.args.logs}|{self.args.seed}|" \
+              f"{self.args.fixture}|{datetime.now(timezone.utc).date()}"
+        return f'"{zlib.crc32(key.encode()):08x}"'
+
+    def send_crt_sh(self, domain):
+        etag = self.validator(domain)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(usegmt=True))
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.write_chunked(self.json_array(self.certs_for(domain)))
+
+    def send_google(self, domain):
+        rows = list(google_rows(self.certs_for(domain)))
+        body = (XSSI_PREFIX + json.dumps([["https.ct.cdsr", rows, [None, None, 1, 1, 1]]])).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def json_array(items, batch=500):
+        """Encode items as one JSON array, in pieces of roughly batch elements"""
+        yield "["
+        pending = []
+        first = True
+        for item in items:
+            pending.append(json.dumps(item))
+            if len(pending) >= batch:
+                yield ("" if first else ",") + ",".join(pending)
+                first = False
+                pending = []
+        if pending:
+            yield ("" if first else ",") + ",".join(pending)
+        yield "]"
+
+    def write_chunked(self, pieces):
+        try:
+            for piece in pieces:
+                data = piece.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if self.args.verbose:
+            super().log_message(format, *args)
+
+def main():
+    args = parse_arguments()
+    CTStandInHandler.args = args
+    if args.fixture:
+        try:
+            with open(args.fixture) as f:
+                CTStandInHandler.fixture = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"Error: Could not load fixture {args.fixture}: {e}")
+            sys.exit(1)
+        print(f"Serving {len(CTStandInHandler.fixture)} recorded certificates from {args.fixture}")
+    else:
+        print(f"Serving {args.certs} synthetic certificates per domain "
+              f"({args.recent_percent}% recent, {args.logs} CT logs)")
+
+    server = ThreadingHTTPServer((args.bind, args.port), CTStandInHandler)
+    server.daemon_threads = True
+    print(f"Stand-in CT server on http://{args.bind}:{args.port}/ "
+          f"(latency {args.latency_ms}ms, errors {args.error_percent}%)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    server.server_close()
+
+if __name__ == "__main__":
+    main()
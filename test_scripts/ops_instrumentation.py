@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Shared timing and profiling instrumentation for the Python ops tools
+
+ct_log_checker.py, aws_secrets_manager.py and test_app.py opt in with
+--trace PATH. While enabled, the module records wall time per phase and per
+remote call, retry counts and bytes transferred, and on exit writes one JSON
+file. That file is both a machine-readable summary and a Chrome trace (open it
+in chrome://tracing or https://ui.perfetto.dev). --profile adds cProfile
+(main thread, saved as PATH.prof) or a dependency-free sampling profiler
+(all threads, saved as collapsed stacks in PATH.folded for flamegraph tools).
+
+When --trace is not given every hook returns immediately, so the
+instrumented code paths cost next to nothing.
+
+Usage from a tool:
+  import ops_instrumentation
+  from ops_instrumentation import tracer
+
+  ops_instrumentation.add_arguments(parser)
+  ...
+  ops_instrumentation.start_from_args(args, "my_tool")
+  with tracer.phase("fetch"):
+      with tracer.remote_call("GET crt.sh", url=url) as call:
+          call["status"] = response.status_code
+  tracer.finish()
+
+Requirements:
+  - Python 3.6+
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+MAX_EVENTS = 100000  # Trace events kept; later ones are only aggregated
+SAMPLE_INTERVAL = 0.005  # Seconds between samples of the sampling profiler
+
+def add_arguments(parser):
+    """Add the --trace and --profile options to an argparse parser"""
+    parser.add_argument("--trace", metavar="PATH",
+                        help="Record phase and remote call timings and write them to PATH as JSON/Chrome trace")
+    parser.add_argument("--profile", choices=["cprofile", "sample"],
+                        help="With --trace, also profile: cprofile (main thread, PATH.prof) or "
+                             "sample (all threads, PATH.folded)")
+
+def start_from_args(args, tool):
+    """Enable the shared tracer when the parsed arguments ask for it"""
+    if getattr(args, "trace", None):
+        tracer.start(args.trace, tool, getattr(args, "profile", None))
+    elif getattr(args, "profile", None):
+        print("Warning: --profile has no effect without --trace")
+    return tracer
+
+class _Discard(dict):
+    """Stands in for a call record while tracing is off"""
+
+    def __setitem__(self, key, value):
+        pass
+
+_DISCARD = _Discard()
+
+class Sampler:
+    """Samples the stacks of all threads at a fixed interval"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ops-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ";".join([names.get(ident, str(ident))] + stack[::-1])
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit=15):
+        """Functions that were on top of a stack most often"""
+        leaves = {}
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        return sorted(leaves.items(), key=lambda item: -item[1])[:limit]
+
+class Tracer:
+    """Collects spans, counters and bytes; thread-safe, inert until start()"""
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.tool = None
+        self._lock = threading.Lock()
+        self._events = []
+        self._dropped = 0
+        self._summary = {}
+        self._counters = {}
+        self._threads = {}
+        self._origin = 0.0
+        self._started_at = None
+        self._profiler = None
+        self._profile_kind = None
+
+    def start(self, path, tool, profile=None):
+        self.path = path
+        self.tool = tool
+        self._origin = time.perf_counter()
+        self._started_at = datetime.now().isoformat()
+        self._profile_kind = profile
+        if profile == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif profile == "sample":
+            self._profiler = Sampler()
+            self._profiler.start()
+        self.enabled = True
+
+    def _tid(self):
+        ident = threading.get_ident()
+        thread = self._threads.get(ident)
+        if thread is None:
+            thread = self._threads[ident] = (len(self._threads) + 1, threading.current_thread().name)
+        return thread[0]
+
+    def _record(self, kind, name, started, seconds, args):
+        with self._lock:
+            entry = self._summary.get(name)
+            if entry is None:
+                entry = self._summary[name] = {"kind": kind, "count": 0, "total_s": 0.0, "max_s": 0.0,
+                                               "bytes": 0, "retries": 0, "errors": 0}
+            entry["count"] += 1
+            entry["total_s"] += seconds
+            entry["max_s"] = max(entry["max_s"], seconds)
+            entry["bytes"] += args.get("bytes") or 0
+            entry["retries"] += args.get("retries") or 0
+            if args.get("error"):
+                entry["errors"] += 1
+            if len(self._events) < MAX_EVENTS:
+                self._events.append({
+                    "name": name, "cat": kind, "ph": "X", "pid": os.getpid(), "tid": self._tid(),
+                    "ts": round((started - self._origin) * 1e6, 1), "dur": round(seconds * 1e6, 1),
+                    "args": {key: value for key, value in args.items() if value is not None},
+                })
+            else:
+                self._dropped += 1
+
+    @contextmanager
+    def _span(self, kind, name, args):
+        if not self.enabled:
+            yield _DISCARD
+            return
+        record = dict(args)
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            self._record(kind, name, started, time.perf_counter() - started, record)
+
+    def phase(self, name, **args):
+        """Time a stage of the tool: with tracer.phase("export"): ..."""
+        return self._span("phase", name, args)
+
+    def remote_call(self, name, **args):
+        """Time one remote call; set "status", "bytes", "retries" or "error" on the yielded record"""
+        return self._span("call", name, args)
+
+    def record_call(self, name, started, seconds, **args):
+        """Record a remote call timed elsewhere (started is a time.perf_counter() value)"""
+        if self.enabled:
+            self._record("call", name, started, seconds, args)
+
+    def count(self, name, amount=1):
+        """Increment a named counter, e.g. retries"""
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self):
+        with self._lock:
+            entries = {name: dict(entry, total_s=round(entry["total_s"], 6), max_s=round(entry["max_s"], 6),
+                                  mean_s=round(entry["total_s"] / entry["count"], 6) if entry["count"] else 0.0)
+                       for name, entry in self._summary.items()}
+            return {
+                "tool": self.tool,
+                "argv": sys.argv,
+                "started": self._started_at,
+                "wall_s": round(time.perf_counter() - self._origin, 6),
+                "entries": entries,
+                "counters": dict(self._counters),
+                "dropped_events": self._dropped,
+            }
+
+    def finish(self, print_summary=True):
+        """Stop profiling and write the trace; safe to call when tracing is off"""
+        if not self.enabled:
+            return None
+        self.enabled = False
+        profile_note = None
+        if self._profile_kind == "cprofile":
+            self._profiler.disable()
+            self._profiler.dump_stats(self.path + ".prof")
+            profile_note = self.path + ".prof"
+        elif self._profile_kind == "sample":
+            self._profiler.stop()
+            self._profiler.write(self.path + ".folded")
+            profile_note = self.path + ".folded"
+
+        summary = self.summary()
+        with self._lock:
+            events = list(self._events)
+        thread_names = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                         "args": {"name": name}}
+                        for tid, name in self._threads.values()]
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"traceEvents": thread_names + events, "displayTimeUnit": "ms",
+                           "summary": summary}, f)
+        except IOError as e:
+            print(f"Error writing trace: {e}")
+            return summary
+
+        if print_summary:
+            self.print_summary(summary)
+            if self._profile_kind == "cprofile":
+                stream = io.StringIO()
+                pstats.Stats(self.path + ".prof", stream=stream).sort_stats("cumulative").print_stats(15)
+                print(stream.getvalue())
+            elif self._profile_kind == "sample":
+                print(f"Sampling profile: {self._profiler.samples} samples, most frequent leaf functions:")
+                for function, count in self._profiler.top():
+                    print(f"  {count:6d}  {function}")
+            print(f"Trace written to {self.path}" + (f", profile to {profile_note}" if profile_note else ""))
+        return summary
+
+    @staticmethod
+    def print_summary(summary, limit=20):
+        print(f"\nTiming summary ({summary['wall_s']:.3f}s wall):")
+        entries = sorted(summary["entries"].items(), key=lambda item: -item[1]["total_s"])
+        for name, entry in entries[:limit]:
+            extra = ""
+            if entry["bytes"]:
+                extra += f", {entry['bytes']} bytes"
+            if entry["retries"]:
+                extra += f", {entry['retries']} retries"
+            if entry["errors"]:
+                extra += f", {entry['errors']} errors"
+            print(f"  {entry['kind']:5s} {name}: {entry['count']}x, total {entry['total_s'] * 1000:.1f}ms, "
+                  f"max {entry['max_s'] * 1000:.1f}ms{extra}")
+        for name, value in sorted(summary["counters"].items()):
+            print(f"  count {name}: {value}")
+        if summary["dropped_events"]:
+            print(f"  ({summary['dropped_events']} events beyond {MAX_EVENTS} were aggregated but not traced)")
+
+# Process-wide tracer shared by every tool and module
+tracer = Tracer()
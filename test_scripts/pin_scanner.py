@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Certificate Pin Scanner
+
+Opens TLS connections to many host:port targets concurrently, extracts the
+SHA-256 pins of the leaf and chain certificates' SubjectPublicKeyInfo (the
+value Android/iOS pinning uses) and compares them with the primary/backup
+fingerprints of a JSON export from aws_secrets_manager.py. Prints a mismatch
+report with per-host connect and handshake latency.
+
+Stored fingerprints may be SPKI pins (base64, optionally prefixed with
+"sha256/") or SHA-256 certificate fingerprints (hex, with or without colons);
+both are checked against every certificate the server presents.
+
+Usage:
+  python pin_scanner.py --pins fingerprints.json [--targets api.example.com,cdn.example.com:8443]
+                        [--targets-file hosts.txt] [--concurrency 50] [--timeout 10]
+                        [--resolve api.example.com:443:127.0.0.1] [--output-json report.json]
+
+  # Against simple_https_server.py running locally on port 8443
+  python pin_scanner.py --pins fingerprints.json --targets invalid.example.com:8443 \\
+      --resolve invalid.example.com:8443:127.0.0.1
+
+Requirements:
+  - Python 3.7+ (3.10+ to read the full chain; older versions only see the leaf)
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import ssl
+import sys
+import time
+from datetime import datetime
+
+DEFAULT_PORT = 443
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Scan TLS endpoints and verify their SPKI pins")
+    parser.add_argument("--pins", required=True,
+                        help="Fingerprint JSON in the aws_secrets_manager.py export format")
+    parser.add_argument("--targets", help="Comma-separated host[:port] list (default: every domain in --pins)")
+    parser.add_argument("--targets-file", help="File with one host[:port] per line")
+    parser.add_argument("--resolve", action="append", default=[], metavar="HOST:PORT:ADDRESS",
+                        help="Connect to ADDRESS for HOST:PORT, keeping HOST for SNI; repeatable")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="Maximum TLS connections open at once (default: 50)")
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="Seconds allowed for connect plus handshake (default: 10)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Also require a chain trusted by the system CA store")
+    parser.add_argument("--verbose", action="store_true", help="Print the pins of every certificate")
+    parser.add_argument("--output-json", help="Path to output JSON report")
+    return parser.parse_args()
+
+def read_der_header(data, offset):
+    """Return (tag, start of contents, end of element) for the DER element at offset"""
+    if offset + 2 > len(data):
+        raise ValueError("DER element header runs past the end of the certificate")
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7F
+        if count == 0 or count > 4:
+            raise ValueError("Unsupported DER length encoding")
+        if offset + count > len(data):
+            raise ValueError("DER element header runs past the end of the certificate")
+        length = int.from_bytes(data[offset:offset + count], "big")
+        offset += count
+    end = offset + length
+    if end > len(data):
+        raise ValueError("DER element runs past the end of the certificate")
+    return tag, offset, end
+
+def extract_spki(cert_der):
+    """Return the DER SubjectPublicKeyInfo of an X.509 certificate.
+
+    Certificate ::= SEQUENCE { tbsCertificate, ... } and tbsCertificate is
+    SEQUENCE { [0] version OPTIONAL, serialNumber, signature, issuer,
+    validity, subject, subjectPublicKeyInfo, ... }, so the SPKI is the sixth
+    element of tbsCertificate once the optional version is skipped.
+    """
+    tag, start, _ = read_der_header(cert_der, 0)
+    if tag != 0x30:
+        raise ValueError("Certificate is not a DER SEQUENCE")
+    tag, offset, _ = read_der_header(cert_der, start)
+    if tag != 0x30:
+        raise ValueError("tbsCertificate is not a DER SEQUENCE")
+    tag, _, end = read_der_header(cert_der, offset)
+    if tag == 0xA0:
+        offset = end
+    # serialNumber, signature, issuer, validity, subject
+    for _ in range(5):
+        _, _, offset = read_der_header(cert_der, offset)
+    tag, _, end = read_der_header(cert_der, offset)
+    if tag != 0x30:
+        raise ValueError("subjectPublicKeyInfo is not a DER SEQUENCE")
+    return cert_der[offset:end]
+
+def certificate_pins(cert_der):
+    """SPKI pin (base64) and certificate fingerprint (hex) for one DER certificate"""
+    spki = hashlib.sha256(extract_spki(cert_der)).digest()
+    return {
+        "spki_sha256": base64.b64encode(spki).decode(),
+        "cert_sha256": hashlib.sha256(cert_der).hexdigest(),
+    }
+
+def normalize_fingerprint(value):
+    """Return a stored fingerprint as the hex of its SHA-256 digest, or None if it is not one"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.lower().startswith("sha256/"):
+        value = value[len("sha256/"):]
+    hex_form = value.replace(":", "")
+    if len(hex_form) == 64:
+        try:
+            return bytes.fromhex(hex_form).hex()
+        except ValueError:
+            pass
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return digest.hex() if len(digest) == 32 else None
+
+def peer_chain(ssl_object):
+    """DER certificates the server sent, leaf first"""
+    getter = getattr(ssl_object, "get_unverified_chain", None)  # Python 3.13+
+    if getter is None:
+        # Available on the C object since 3.10, before it was made public
+        getter = getattr(getattr(ssl_object, "_sslobj", None), "get_unverified_chain", None)
+    if getter is not None:
+        chain = getter() or []
+        # Certificate objects only export PEM through public API
+        return [cert if isinstance(cert, bytes) else ssl.PEM_cert_to_DER_cert(cert.public_bytes())
+                for cert in chain]
+    leaf = ssl_object.getpeercert(binary_form=True)
+    return [leaf] if leaf else []
+
+def parse_target(value):
+    """Split host[:port] (or [v6]:port) into (host, port)"""
+    value = value.strip()
+    if value.startswith("["):
+        host, _, rest = value[1:].partition("]")
+        return host, int(rest[1:]) if rest.startswith(":") else DEFAULT_PORT
+    if value.count(":") == 1:
+        host, port = value.split(":")
+        return host, int(port)
+    return value, DEFAULT_PORT
+
+def parse_resolve(values):
+    """Map (host, port) to the address from --resolve HOST:PORT:ADDRESS"""
+    overrides = {}
+    for value in values:
+        host, port, address = value.split(":", 2)
+        overrides[(host.lower(), int(port))] = address.strip("[]")
+    return overrides
+
+def match_pins(chain_pins, fingerprints):
+    """Return (which stored fingerprint matched, where, how) or None"""
+    stored = {}
+    for label in ("primary", "backup"):
+        normalized = normalize_fingerprint(fingerprints.get(label))
+        if normalized:
+            stored.setdefault(normalized, label)
+    for position, pins in enumerate(chain_pins):
+        where = "leaf" if position == 0 else f"chain[{position}]"
+        spki_hex = base64.b64decode(pins["spki_sha256"]).hex()
+        if spki_hex in stored:
+            return stored[spki_hex], where, "spki"
+        if pins["cert_sha256"] in stored:
+            return stored[pins["cert_sha256"]], where, "certificate"
+    return None
+
+class PinScanner:
+    """Scans targets concurrently, at most `concurrency` handshakes in flight"""
+
+    def __init__(self, fingerprints, concurrency=50, timeout=10, verify=False, resolve=None):
+        self.fingerprints = {domain.lower(): value for domain, value in fingerprints.items()}
+        self.concurrency = max(concurrency, 1)
+        self.timeout = timeout
+        self.resolve = resolve or {}
+        if verify:
+            self.context = ssl.create_default_context()
+        else:
+            # Pins are checked independently of the CA chain, so self-signed test servers scan too
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            self.context.check_hostname = False
+            self.context.verify_mode = ssl.CERT_NONE
+
+    async def handshake(self, host, port):
+        """Connect and handshake; returns (chain DER list, TLS version, connect s, handshake s)"""
+        loop = asyncio.get_running_loop()
+        address = self.resolve.get((host.lower(), port), host)
+        started = time.perf_counter()
+        transport, protocol = await loop.create_connection(asyncio.Protocol, address, port)
+        connected = time.perf_counter()
+        try:
+            tls_transport = await loop.start_tls(transport, protocol, self.context, server_hostname=host,
+                                                 ssl_handshake_timeout=self.timeout)
+        except BaseException:
+            transport.close()
+            raise
+        done = time.perf_counter()
+        try:
+            ssl_object = tls_transport.get_extra_info("ssl_object")
+            return peer_chain(ssl_object), ssl_object.version(), connected - started, done - connected
+        finally:
+            tls_transport.close()
+
+    async def scan_one(self, semaphore, host, port):
+        result = {"target": f"{host}:{port}", "host": host, "port": port}
+        fingerprints = self.fingerprints.get(host.lower())
+        async with semaphore:
+            try:
+                chain, version, connect_s, handshake_s = await asyncio.wait_for(
+                    self.handshake(host, port), self.timeout)
+            except (OSError, ssl.SSLError, asyncio.TimeoutError) as e:
+                result.update(status="ERROR", message=f"{type(e).__name__}: {e}".rstrip(": "))
+                return result
+        result["tls_version"] = version
+        result["connect_ms"] = round(connect_s * 1000, 2)
+        result["handshake_ms"] = round(handshake_s * 1000, 2)
+        try:
+            result["chain"] = [certificate_pins(cert) for cert in chain]
+        except ValueError as e:
+            result.update(status="ERROR", message=f"Could not parse certificate: {e}")
+            return result
+        if not result["chain"]:
+            result.update(status="ERROR", message="Server presented no certificate")
+        elif fingerprints is None:
+            result.update(status="NO_PINS", message="No stored fingerprints for this host")
+        else:
+            matched = match_pins(result["chain"], fingerprints)
+            if matched is None:
+                result.update(status="MISMATCH",
+                              message="Neither the primary nor the backup fingerprint matches any certificate")
+            else:
+                label, where, kind = matched
+                result.update(status="OK", matched=label,
+                              message=f"{label} fingerprint matches the {where} {kind} pin")
+        return result
+
+    async def scan(self, targets):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self.scan_one(semaphore, host, port) for host, port in targets))
+
+def main():
+    args = parse_arguments()
+    try:
+        with open(args.pins) as f:
+            fingerprints = json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        print(f"Error: Could not read fingerprints from {args.pins}: {e}")
+        sys.exit(2)
+
+    try:
+        raw_targets = []
+        if args.targets:
+            raw_targets += [t for t in args.targets.split(",") if t.strip()]
+        if args.targets_file:
+            with open(args.targets_file) as f:
+                raw_targets += [line for line in f if line.strip() and not line.startswith("#")]
+        if not raw_targets:
+            raw_targets = list(fingerprints)
+        targets = list(dict.fromkeys(parse_target(t) for t in raw_targets))
+        resolve = parse_resolve(args.resolve)
+    except (IOError, ValueError) as e:
+        print(f"Error: Invalid targets: {e}")
+        sys.exit(2)
+
+    print(f"Scanning {len(targets)} targets with up to {args.concurrency} concurrent connections...")
+    scanner = PinScanner(fingerprints, args.concurrency, args.timeout, args.verify, resolve)
+    started = time.perf_counter()
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(scanner.scan(targets))
+    finally:
+        loop.close()
+    elapsed = time.perf_counter() - started
+
+    exit_code = 0
+    for result in results:
+        status = result["status"]
+        timing = ""
+        if "handshake_ms" in result:
+            timing = f" (connect {result['connect_ms']}ms, handshake {result['handshake_ms']}ms, " \
+                     f"{result['tls_version']})"
+        symbol = "✓" if status == "OK" else "✗" if status in ("MISMATCH", "ERROR") else "⚠"
+        print(f"{symbol} {result['target']}: {status} - {result['message']}{timing}")
+        if args.verbose:
+            for position, pins in enumerate(result.get("chain", [])):
+                print(f"    [{position}] spki sha256/{pins['spki_sha256']}  cert {pins['cert_sha256']}")
+        if status == "ERROR":
+            exit_code = 2
+        elif status != "OK":
+            exit_code = max(exit_code, 1)
+
+    handshakes = sorted(r["handshake_ms"] for r in results if "handshake_ms" in r)
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print(f"\nSummary: {', '.join(f'{n} {s}' for s, n in sorted(counts.items()))} "
+          f"in {elapsed:.2f}s ({len(results) / elapsed:.0f} targets/s)")
+    if handshakes:
+        print(f"Handshake latency: p50 {handshakes[len(handshakes) // 2]}ms, "
+              f"max {handshakes[-1]}ms")
+
+    if args.output_json:
+        try:
+            with open(args.output_json, "w") as f:
+                json.dump({
+                    "timestamp": datetime.now().isoformat(),
+                    "pins_file": args.pins,
+                    "elapsed_s": round(elapsed, 3),
+                    "results": results
+                }, f, indent=2)
+            print(f"\nJSON report written to {args.output_json}")
+        except IOError as e:
+            print(f"Error writing JSON report: {e}")
+
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
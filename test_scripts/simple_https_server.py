@@ -1,16 +1,292 @@
-import http.server, ssl, sys
+#!/usr/bin/env python3
+"""
+Simple HTTPS Test Server
 
-port = int(sys.argv[1]) if len(sys.argv) > 1 else 8443
-cert_file = sys.argv[2] if len(sys.argv) > 2 else 'invalid_cert.pem'
-key_file = sys.argv[3] if len(sys.argv) > 3 else 'invalid_key.pem'
+Serves the current directory over TLS for certificate pinning and rotation
+tests. Connections are handled concurrently, TLS sessions can be resumed
+(session tickets on TLS 1.3, session IDs on TLS 1.2), extra certificates can
+be selected by SNI, and the certificate/key files are watched and reloaded
+atomically when they change, so a rotation can be tested without restarting
+the server or dropping open connections. Handshake counts and timings are
+printed periodically and served as JSON from --stats-path.
 
-handler = http.server.SimpleHTTPRequestHandler
+Usage:
+  python simple_https_server.py [port] [cert_file] [key_file]
+                                [--sni api.example.com=api_cert.pem:api_key.pem]
+                                [--mode threaded] [--tickets 2] [--reload-interval 1]
+                                [--stats-interval 10] [--stats-path /__tls_stats]
 
-context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+Requirements:
+  - Python 3.8+
+"""
 
-httpd = http.server.HTTPServer(('localhost', port), handler)
-httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+import argparse
+import http.server
+import json
+import os
+import ssl
+import sys
+import threading
+import time
 
-print(f"Server running on https://localhost:{port}")
-httpd.serve_forever()
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="HTTPS test server with SNI, session resumption and hot reload")
+    parser.add_argument("port", nargs="?", type=int, default=8443, help="Port to listen on (default: 8443)")
+    parser.add_argument("cert_file", nargs="?", default="invalid_cert.pem",
+                        help="Default certificate chain (default: invalid_cert.pem)")
+    parser.add_argument("key_file", nargs="?", default="invalid_key.pem",
+                        help="Key for the default certificate (default: invalid_key.pem)")
+    parser.add_argument("--bind", default="localhost", help="Address to bind to (default: localhost)")
+    parser.add_argument("--sni", action="append", default=[], metavar="HOST=CERT:KEY",
+                        help="Serve CERT/KEY to clients asking for HOST; repeatable")
+    parser.add_argument("--mode", choices=["threaded", "single"], default="threaded",
+                        help="Handle connections concurrently or one at a time (default: threaded)")
+    parser.add_argument("--tickets", type=int, default=2,
+                        help="TLS 1.3 session tickets issued per handshake, 0 disables resumption (default: 2)")
+    parser.add_argument("--reload-interval", type=float, default=1.0,
+                        help="Seconds between checks for changed cert/key files, 0 disables reload (default: 1)")
+    parser.add_argument("--stats-interval", type=float, default=0,
+                        help="Print handshake statistics every N seconds, 0 only on exit (default: 0)")
+    parser.add_argument("--stats-path", default="/__tls_stats",
+                        help="URL path serving handshake statistics as JSON, empty to disable (default: /__tls_stats)")
+    parser.add_argument("--handshake-timeout", type=float, default=10,
+                        help="Seconds a client gets to finish the TLS handshake (default: 10)")
+    return parser.parse_args()
+
+def parse_sni_option(value):
+    """Split HOST=CERT:KEY into (host, cert, key)"""
+    host, sep, files = value.partition("=")
+    cert, sep2, key = files.rpartition(":")
+    if not sep or not sep2 or not host or not cert or not key:
+        raise ValueError(f"--sni expects HOST=CERT:KEY, got {value!r}")
+    return host.lower(), cert, key
+
+class CertificateStore:
+    """Current SSLContexts for the default certificate and every SNI name.
+
+    reload_if_changed() builds a complete new set of contexts and swaps it in
+    with a single assignment, so a handshake always sees either the old or the
+    new certificates, never a mix. Connections that are already established
+    keep the context they were created with.
+    """
+
+    def __init__(self, default_files, sni_files, tickets):
+        self.default_files = default_files
+        self.sni_files = sni_files
+        self.tickets = tickets
+        self.reloads = 0
+        self._mtimes = None
+        self._context = None
+        self.reload_if_changed(force=True)
+
+    def _files(self):
+        return [self.default_files] + list(self.sni_files.values())
+
+    def _current_mtimes(self):
+        return [(os.stat(cert).st_mtime_ns, os.stat(key).st_mtime_ns) for cert, key in self._files()]
+
+    def _make_context(self, cert, key):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile=cert, keyfile=key)
+        if self.tickets > 0:
+            context.num_tickets = self.tickets
+        else:
+            context.num_tickets = 0
+            context.options |= ssl.OP_NO_TICKET
+        return context
+
+    def _build(self):
+        default = self._make_context(*self.default_files)
+        by_name = {host: self._make_context(cert, key) for host, (cert, key) in self.sni_files.items()}
+
+        def select(ssl_socket, server_name, _context):
+            # Remember the requested name for the statistics
+            ssl_socket.requested_name = server_name
+            chosen = by_name.get((server_name or "").lower())
+            if chosen is not None:
+                ssl_socket.context = chosen
+        default.sni_callback = select
+        return default
+
+    def reload_if_changed(self, force=False):
+        """Rebuild the contexts when a file changed; returns True if new ones were installed"""
+        try:
+            mtimes = self._current_mtimes()
+            if not force and mtimes == self._mtimes:
+                return False
+            context = self._build()
+        except (OSError, ssl.SSLError) as e:
+            if force:
+                raise
+            # Usually a rotation caught halfway (new cert, old key); retried on the next check
+            print(f"Certificate reload failed, keeping current certificates: {e}")
+            return False
+        self._context = context
+        if self._mtimes is not None:
+            self.reloads += 1
+            print(f"Reloaded certificates ({self.reloads} reloads so far)")
+        self._mtimes = mtimes
+        return True
+
+    def context(self):
+        return self._context
+
+    def watch(self, interval, stop):
+        while not stop.wait(interval):
+            self.reload_if_changed()
+
+class HandshakeStats:
+    """Thread-safe counters and timings for TLS handshakes"""
+
+    def __init__(self, keep=10000):
+        self.keep = keep
+        self.started = time.monotonic()
+        self.total = 0
+        self.resumed = 0
+        self.failed = 0
+        self.by_name = {}
+        self.by_version = {}
+        self._durations = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds, resumed=False, server_name=None, version=None):
+        with self._lock:
+            self.total += 1
+            if resumed:
+                self.resumed += 1
+            name = server_name or "(no SNI)"
+            self.by_name[name] = self.by_name.get(name, 0) + 1
+            if version:
+                self.by_version[version] = self.by_version.get(version, 0) + 1
+            self._durations.append(seconds)
+            if len(self._durations) > self.keep:
+                # Bounded sample of the most recent handshakes
+                del self._durations[:len(self._durations) - self.keep]
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self, reloads=0):
+        with self._lock:
+            durations = sorted(self._durations)
+            report = {
+                "uptime_s": round(time.monotonic() - self.started, 1),
+                "handshakes": self.total,
+                "resumed": self.resumed,
+                "full": self.total - self.resumed,
+                "failed": self.failed,
+                "resumption_rate": round(self.resumed / self.total, 3) if self.total else 0.0,
+                "by_server_name": dict(self.by_name),
+                "by_version": dict(self.by_version),
+                "certificate_reloads": reloads,
+            }
+        if durations:
+            def pick(fraction):
+                return round(durations[min(int(len(durations) * fraction), len(durations) - 1)] * 1000, 3)
+            report["handshake_ms"] = {
+                "mean": round(sum(durations) / len(durations) * 1000, 3),
+                "p50": pick(0.50),
+                "p90": pick(0.90),
+                "p99": pick(0.99),
+                "max": round(durations[-1] * 1000, 3),
+            }
+        return report
+
+class TLSHandler(http.server.SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler plus a JSON statistics endpoint"""
+
+    def do_GET(self):
+        if self.server.stats_path and self.path.split("?", 1)[0] == self.server.stats_path:
+            body = json.dumps(self.server.stats_report(), indent=2).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+class TLSServerMixin:
+    """Wraps each accepted connection with the store's current context.
+
+    The handshake runs in finish_request, i.e. in the worker thread when the
+    server is threaded, so one slow client cannot stall the accept loop.
+    """
+    certificates = None
+    stats = None
+    stats_path = None
+    handshake_timeout = 10
+
+    def finish_request(self, request, client_address):
+        request.settimeout(self.handshake_timeout)
+        started = time.perf_counter()
+        try:
+            tls = self.certificates.context().wrap_socket(request, server_side=True,
+                                                          do_handshake_on_connect=False)
+            tls.do_handshake()
+        except (ssl.SSLError, OSError):
+            self.stats.record_failure()
+            request.close()
+            return
+        self.stats.record(time.perf_counter() - started, tls.session_reused,
+                          getattr(tls, "requested_name", None), tls.version())
+        tls.settimeout(None)
+        try:
+            super().finish_request(tls, client_address)
+        finally:
+            self.shutdown_request(tls)
+
+    def stats_report(self):
+        return self.stats.snapshot(self.certificates.reloads)
+
+class SingleTLSServer(TLSServerMixin, http.server.HTTPServer):
+    pass
+
+class ThreadedTLSServer(TLSServerMixin, http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+def main():
+    args = parse_arguments()
+    try:
+        sni_files = {}
+        for value in args.sni:
+            host, cert, key = parse_sni_option(value)
+            sni_files[host] = (cert, key)
+        certificates = CertificateStore((args.cert_file, args.key_file), sni_files, args.tickets)
+    except (ValueError, OSError, ssl.SSLError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    server_class = ThreadedTLSServer if args.mode == "threaded" else SingleTLSServer
+    server_class.certificates = certificates
+    server_class.stats = HandshakeStats()
+    server_class.stats_path = args.stats_path or None
+    server_class.handshake_timeout = args.handshake_timeout
+    httpd = server_class((args.bind, args.port), TLSHandler)
+
+    stop = threading.Event()
+    if args.reload_interval > 0:
+        threading.Thread(target=certificates.watch, args=(args.reload_interval, stop), daemon=True).start()
+    if args.stats_interval > 0:
+        def print_stats():
+            while not stop.wait(args.stats_interval):
+                print(f"TLS stats: {json.dumps(httpd.stats_report())}")
+        threading.Thread(target=print_stats, daemon=True).start()
+
+    names = ", ".join(sni_files) or "none"
+    print(f"Server running on https://{args.bind}:{args.port} ({args.mode}, SNI names: {names})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        stop.set()
+        httpd.server_close()
+        print(f"TLS stats: {json.dumps(httpd.stats_report(), indent=2)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())